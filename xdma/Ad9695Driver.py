@@ -8,13 +8,55 @@
 
 import random
 
+from dataclasses import dataclass
+
+from xdma.RegisterSequence import RegisterSequence
 from xdma.XdmaSpiController import SpiController
 from xdma.XdmaDeviceFile import *
 
 
+@dataclass
+class Ad9695Status:
+    scrambling: bool
+    octets_per_frame: int  # F
+    frames_per_multiframe: int  # K
+    lanes_in_use: int  # L
+    subclass: int
+    pll_lock: bool
+    loss_of_lock: bool
+
+    @classmethod
+    def decode(cls, link_parameters: np.ndarray, pll_status: int):
+        """link_parameters: registers 0x058B ~ 0x0590"""
+        scrambling_lanes = int(link_parameters[0])
+        return cls(is_bit_set(scrambling_lanes, 7), get_bits(int(link_parameters[1]), 0, 8) + 1,
+                   get_bits(int(link_parameters[2]), 0, 5) + 1, get_bits(scrambling_lanes, 0, 4) + 1,
+                   get_bits(int(link_parameters[5]), 5, 3), is_bit_set(pll_status, 7), is_bit_set(pll_status, 3))
+
+    def show_info(self):
+        print(f"\nAD9695 info:")
+        print(f"\n\tscrambling enabled: {self.scrambling}")
+        print(f"\toctets per frame(F): {self.octets_per_frame}")
+        print(f"\tframes per multiframe(K): {self.frames_per_multiframe}")
+        print(f"\tlanes in use(L): {self.lanes_in_use}")
+        print(f"\tsubclass: {self.subclass}")
+        print(f"\tPLL lock: {self.pll_lock}")
+        print(f"\tLoss of lock: {self.loss_of_lock}")
+
+
 class Ad9695Driver(SpiController):
     SCRATCH_PAD = 0x000A  # a register for software debug
     PLL_STATUS = 0x056F
+    LINK_PARAMETERS = 0x058B  # 0x058B ~ 0x0590, JESD204B L, F, K, M, N and subclass
+
+    # JESD204B link configuration, written by init_for_das only; SCRATCH_PAD is left out as exists() tests the SPI path with it
+    STABLE_REGISTERS = frozenset({0x0002, 0x0120, 0x056E, 0x058B, 0x058C, 0x058D, 0x058E, 0x058F, 0x0590, 0x1908, 0x1910})
+    VOLATILE_REGISTERS = frozenset({0x0000, 0x0001, PLL_STATUS})
+
+    SOFT_RESET_DONE = ((0x0000, 0, 1, 0, 'b'),)  # soft reset bits self-clear
+    DATAPATH_RESET_DONE = ((0x0001, 1, 1, 0, 'b'),)
+    RESET_SETTLE = 0.005  # the reset bits have to read done for this long, a read racing the reset is not taken as done
+    PLL_LOCKED = ((PLL_STATUS, 7, 1, 1, 'b'), (PLL_STATUS, 3, 1, 0, 'b'))  # locked, no loss of lock
 
     def exists(self):
         original = self.read_byte(self.SCRATCH_PAD)
@@ -27,19 +69,24 @@ class Ad9695Driver(SpiController):
 
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address, 0x4_0000)
+        self.configuration_report = None  # BatchReport of the last init_for_das
 
     def soft_reset(self):
         self.write_byte(0x0000, 0x81)  # soft reset,这个寄存器是对称的,因为这个寄存器决定了SPI的MSB/LSB first设置,它必须兼容MSB/LSB first
-        time.sleep(0.1)
+        self.invalidate_shadow()
+        assert self.wait_until(self.SOFT_RESET_DONE, timeout=0.1, settle=self.RESET_SETTLE, label="AD9695 soft reset"), \
+            "AD9695 soft reset in progress"
 
     def datapath_soft_reset(self):
         self.write_byte(0x0001, 0x02)  # datapath soft reset
-        time.sleep(0.1)
+        assert self.wait_until(self.DATAPATH_RESET_DONE, timeout=0.1, settle=self.RESET_SETTLE,
+                               label="AD9695 datapath soft reset"), "AD9695 datapath soft reset in progress"
 
     def check_accessibility(self):
         assert self.read_byte(0x0004) == 0xDE and self.read_byte(0x0005) == 0x00, "AD9695 not accessible"
 
-    def set_fast_detect(self, function: str):
+    def set_fast_detect(self, function: str, batch=None):
+        """given batch (RegisterBatch or RegisterSequence), the writes are only added to it"""
         function_value = 0
         match function:
             case "force 0":
@@ -55,10 +102,16 @@ class Ad9695Driver(SpiController):
                 fast_detect = False
 
         if fast_detect:
-            self.set_byte(0x0040, 0x00)  # set pin function as fast detect(disabled by default)
-            self.set_byte(0x0245, function_value)  # enable fast detect pins
+            writes = [(0x0040, 0x00),  # set pin function as fast detect(disabled by default)
+                      (0x0245, function_value)]  # enable fast detect pins
+        else:
+            writes = [(0x0040, 0x01)]  # set pin function as GPIO for LMFC
+        if batch is None:
+            for addr, value in writes:
+                self.set_byte(addr, value)
         else:
-            self.set_byte(0x0040, 0x01)  # set pin function as GPIO for LMFC
+            for addr, value in writes:
+                batch.write(addr, value)
 
     def check_status(self):
         assert is_bit_set(self.read_byte(self.PLL_STATUS), 7) and not is_bit_set(self.read_byte(self.PLL_STATUS), 3), "AD9695: bad status"
@@ -72,71 +125,76 @@ class Ad9695Driver(SpiController):
             case "toggle":
                 self.set_byte(0x0573, 0x02)
 
-    def init_for_das(self, startup_mode: str = "normal"):
+    def das_sequence(self, startup_mode: str = "normal") -> RegisterSequence:
+        sequence = RegisterSequence("AD9695 DAS", 'b')
         match startup_mode:
             case "normal":
-                self.set_byte(0x0002, 0x00)  # power-up
+                sequence.write(0x0002, 0x00)  # power-up
             case "standby":
-                self.set_byte(0x0002, 0x02)  # standby mode, disable datapath, sending known data through JESD204B interface
-        self.soft_reset()
-        self.datapath_soft_reset()
+                sequence.write(0x0002, 0x02)  # standby mode, disable datapath, sending known data through JESD204B interface
+        sequence.write(0x0000, 0x81, verify=False, reset=True, delay=0.1, until=self.SOFT_RESET_DONE,
+                       settle=self.RESET_SETTLE)  # soft reset
+        sequence.write(0x0001, 0x02, verify=False, reset=True, delay=0.1, until=self.DATAPATH_RESET_DONE,
+                       settle=self.RESET_SETTLE)  # datapath soft reset
         # 设置量程
-        # self.set_byte(0x1910, 0x00)  # 设置量程为最大值,2.04Vpp
-        self.set_byte(0x1910, 0x0A)  # 设置量程为最小值,1.36Vpp
+        # sequence.write(0x1910, 0x00)  # 设置量程为最大值,2.04Vpp
+        sequence.write(0x1910, 0x0A)  # 设置量程为最小值,1.36Vpp
         # 设置直流耦合,参见 "performing SPI writes for dc coupling operation" in AD9695 manual
-        self.set_byte(0x1908, 0x04)  # 设置耦合方式为DC
-        self.set_byte(0x18A6, 0x00)  # turn off the voltage reference
-        self.set_byte(0x18E6, 0x00)  # turn off the temperature diode export
-        self.set_byte(0x18E0, 0x02)
-        self.set_byte(0x18E1, 0x14)
-        self.set_byte(0x18E2, 0x14)
-        self.set_byte(0x18E3, 0x40)
-        self.set_byte(0x18E3, 0x54)
-        time.sleep(0.1)
+        sequence.write(0x1908, 0x04)  # 设置耦合方式为DC
+        sequence.write(0x18A6, 0x00)  # turn off the voltage reference
+        sequence.write(0x18E6, 0x00)  # turn off the temperature diode export
+        sequence.write(0x18E0, 0x02)
+        sequence.write(0x18E1, 0x14)
+        sequence.write(0x18E2, 0x14)
+        sequence.write(0x18E3, 0x40)
+        sequence.write(0x18E3, 0x54, delay=0.1)
         # 设置JESD204B参数,参见Use the following procedure to configure the output
-        self.write_byte(0x0571, 0x15)  # turn off the link, sending K28.5 in standby mode
-        self.set_byte(0x056E, 0x00)  # 线速率范围,6.75 Gbps to 13.5 Gbps
-        self.set_byte(0x058B, 0x83)  # turn on scrambling, lanes per link(L) = 4
-        self.set_byte(0x058C, 0x00)  # octets per frames(F) = 1
-        self.set_byte(0x058D, 0x1F)  # K = 32
-        self.set_byte(0x058E, 0x01)  # M = 2
-        self.set_byte(0x058F, 0x0D)  # CS = 0, N = 14
-        self.set_byte(0x0120, 0x02)  # SYSREF±,continuous
-        # self.set_byte(0x0120, 0x04)  # SYSREF±,N-shot
-        self.write_byte(0x0571, 0x14)  # turn on the link, sending K28.5 in standby mode
+        sequence.write(0x0571, 0x15, verify=False, always=True)  # turn off the link, sending K28.5 in standby mode
+        sequence.write(0x056E, 0x00)  # 线速率范围,6.75 Gbps to 13.5 Gbps
+        sequence.write(0x058B, 0x83)  # turn on scrambling, lanes per link(L) = 4
+        sequence.write(0x058C, 0x00)  # octets per frames(F) = 1
+        sequence.write(0x058D, 0x1F)  # K = 32
+        sequence.write(0x058E, 0x01)  # M = 2
+        sequence.write(0x058F, 0x0D)  # CS = 0, N = 14
+        sequence.write(0x0120, 0x02)  # SYSREF±,continuous
+        # sequence.write(0x0120, 0x04)  # SYSREF±,N-shot
+        sequence.write(0x0571, 0x14, verify=False, always=True, delay=0.1)  # turn on the link, sending K28.5 in standby mode
         # setting up JESD204B test mode
 
-        time.sleep(0.1)
         # JESD204B初始化,参见Table 34
-        self.set_byte(0x1228, 0x4F)
-        self.set_byte(0x1228, 0x0F)
-        self.set_byte(0x1222, 0x00)
-        self.set_byte(0x1222, 0x04)
-        self.set_byte(0x1222, 0x00)
-        self.set_byte(0x1262, 0x08)
-        self.set_byte(0x1262, 0x00)
-        time.sleep(0.1)
-        self.set_fast_detect("LMFC")  # 设置fast detect引脚功能
-        # self.set_byte(0x0572, 0x20) # invert syncinb
-        # self.set_byte(0x0572, 0x80) # force CGS
-        time.sleep(1.0)
-        return self.init_done()
+        sequence.write(0x1228, 0x4F, always=True)
+        sequence.write(0x1228, 0x0F, always=True)
+        sequence.write(0x1222, 0x00, always=True)
+        sequence.write(0x1222, 0x04, always=True)
+        sequence.write(0x1222, 0x00, always=True)
+        sequence.write(0x1262, 0x08, always=True)
+        sequence.write(0x1262, 0x00, always=True, delay=0.1)
+        self.set_fast_detect("LMFC", sequence)  # 设置fast detect引脚功能
+        # sequence.write(0x0572, 0x20) # invert syncinb
+        # sequence.write(0x0572, 0x80) # force CGS
+        return sequence.delay(1.0, until=self.PLL_LOCKED)
+
+    def init_for_das(self, startup_mode: str = "normal", verify: str = 'end', diff: bool = False):
+        """
+        diff = True only writes the registers which differ, see RegisterSequence.run, the verification and wait results
+        are kept in configuration_report, a mismatch or a wait timing out fails the initialization
+        """
+        self.configuration_report = self.das_sequence(startup_mode).run(self, diff, verify)
+        return self.configuration_report.ok and self.init_done()
 
     def init_done(self):
-        pll_lock = is_bit_set(self.read_byte(self.PLL_STATUS), 7)
-        pll_not_loss = not is_bit_set(self.read_byte(self.PLL_STATUS), 3)
+        pll_status = self.read_byte(self.PLL_STATUS)
+        pll_lock = is_bit_set(pll_status, 7)
+        pll_not_loss = not is_bit_set(pll_status, 3)
         return pll_lock and pll_not_loss
 
+    def read_status(self) -> "Ad9695Status":
+        # byte registers cost an SPI transaction each, only the link parameter block is read
+        link_parameters = self.read_register_block(self.LINK_PARAMETERS, 6, 'b')
+        return Ad9695Status.decode(link_parameters, self.read_byte(self.PLL_STATUS))
+
     def show_info(self):
-        print(f"\nAD9695 info:")
-        print(f"\n\tscrambling enabled: {is_bit_set(self.read_byte(0x058B), 0)}")
-        print(f"\toctets per frame(F): {get_bits(self.read_byte(0x058C), 0, 8) + 1}")
-        print(f"\tframes per multiframe(K): {get_bits(self.read_byte(0x058D), 0, 5) + 1}")
-        print(f"\tlanes in use(L): {get_bits(self.read_byte(0x058B), 0, 4) + 1}")
-        print(f"\tsubclass: {get_bits(self.read_byte(0x0590), 5, 3)}")
-        pll_stauts = self.read_byte(self.PLL_STATUS)
-        print(f"\tPLL lock: {is_bit_set(pll_stauts, 7)}")
-        print(f"\tLoss of lock: {is_bit_set(pll_stauts, 3)}")
+        self.read_status().show_info()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 13:40
+# @Author  : DAS
+# @Site    :
+# @File    : AsyncXdmaDeviceFile.py
+# @Software: PyCharm
+# @Comment : asyncio interface of XdmaDeviceFile
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from xdma.XdmaDeviceFile import *
+
+
+class AsyncXdmaDeviceFile:
+    """
+    Awaitable counterpart of an XdmaDeviceFile
+
+    Blocking transfers run on bounded executors owned by this device file, one per direction with max_workers threads
+    each, so h2c and c2h transfers overlap with each other, with other channels and with the rest of the event loop.
+    Register polling reads the cached mmap window directly and sleeps with asyncio.sleep, it never blocks the loop.
+    """
+
+    def __init__(self, device: XdmaDeviceFile, max_workers: int = 1):
+        assert max_workers > 0
+        self.device = device
+        self.h2c_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"xdma-h2c-{id(device):x}")
+        self.c2h_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"xdma-c2h-{id(device):x}")
+
+    async def __aenter__(self):
+        self.device.__enter__()  # session mode, handles stay open for every transfer below
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.device.__exit__(exc_type, exc_val, exc_tb)
+
+    def shutdown(self, wait: bool = True):
+        self.h2c_executor.shutdown(wait=wait)
+        self.c2h_executor.shutdown(wait=wait)
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    ####################
+    # For AXI MM, positional so that several workers of one channel never race on the file offset
+    ####################
+    async def write(self, addr: int, data: np.ndarray) -> int:
+        return await self._run(self.h2c_executor, self.device.write_at, addr, data)
+
+    async def read(self, addr: int, buffer: np.ndarray) -> int:
+        return await self._run(self.c2h_executor, self.device.read_at, addr, buffer)
+
+    ####################
+    # For AXI ST
+    ####################
+    async def write_stream(self, data: np.ndarray) -> int:
+        return await self._run(self.h2c_executor, self.device.write_stream, data)
+
+    async def read_stream(self, buffer: np.ndarray) -> int:
+        return await self._run(self.c2h_executor, self.device.read_stream, buffer)
+
+    ####################
+    # For AXI LITE
+    ####################
+    async def wait_register_field(self, addr: int, start: int, length: int, value: int,
+                                  interval: float = 0.01, timeout: float = 1.0) -> bool:
+        """
+        Poll a register field until it equals value, return False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if self.device.read_register_field(addr, start, length) == value:
+                return True
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+
+    async def loopback(device: AsyncXdmaDeviceFile, block_size: int, block_count: int):
+        # h2c and c2h of the same card overlap, each direction has its own executor
+        source = np.random.randint(0, 256, size=block_size, dtype=np.uint8)
+        target = np.empty_like(source)
+        async with device:
+            for i in range(block_count):
+                await asyncio.gather(device.write(i * block_size, source), device.read(i * block_size, target))
+
+
+    with tempfile.NamedTemporaryFile() as stand_in_file:
+        stand_in_file.truncate(256 << 20)
+        stand_in = AsyncXdmaDeviceFile(XdmaDeviceFile(stand_in_file.name, stand_in_file.name, 0, 1 << 30))
+        start = time.time()
+        asyncio.run(loopback(stand_in, 1 << 20, 256))
+        print(f"stand-in loopback: {256 / (time.time() - start)} MB/s per direction")
+        stand_in.shutdown()
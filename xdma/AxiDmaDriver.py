@@ -85,6 +85,75 @@ class SgDescriptor:
         print(f"{self.transferred_bytes} bytes transferred, completed = {self.completed == 1}, error = {error}")
 
 
+@dataclass
+class AxiDmaChannelStatus:
+    reset: bool
+    running: bool
+    halted: bool
+    idle: bool
+    keyhole: bool
+    cyclic: bool
+    sg_included: bool
+    dma_internal_error: bool
+    dma_slave_error: bool
+    dma_decode_error: bool
+    sg_internal_error: bool
+    sg_slave_error: bool
+    sg_decode_error: bool
+
+    @classmethod
+    def decode(cls, control: int, status: int):
+        """control: DMACR, status: DMASR of the channel"""
+        control, status = int(control), int(status)
+        return cls(is_bit_set(control, 2), is_bit_set(control, 0), is_bit_set(status, 0), is_bit_set(status, 1),
+                   is_bit_set(control, 3), is_bit_set(control, 4), is_bit_set(status, 3),
+                   is_bit_set(status, 4), is_bit_set(status, 5), is_bit_set(status, 6),
+                   is_bit_set(status, 8), is_bit_set(status, 9), is_bit_set(status, 10))
+
+    def show_info(self, sg_enabled: bool):
+        print(f"\trunning status:")
+        print(
+            f"\t\treset: {self.reset}\n\t\trunning: {self.running}\n\t\thalted: {self.halted}\n\t\tidle: {self.idle}\n\t\tkeyhole:{self.keyhole}\n\t\tcyclic:{self.cyclic}")
+        if sg_enabled:
+            print(f"\terror status:")
+            print(f"\t\tsg_internal_error: {self.sg_internal_error}\n\t\tsg_slave_error: {self.sg_slave_error}\n\t\tsg_decode_error: {self.sg_decode_error}")
+        else:
+            print(f"\tdma_internal_error: {self.dma_internal_error}, dma_slave_error: {self.dma_slave_error}, dma_decode_error: {self.dma_decode_error}")
+
+
+@dataclass
+class AxiDmaStatus:
+    s2mm_enabled: bool
+    mm2s_enabled: bool
+    sg_enabled: bool
+    s2mm: AxiDmaChannelStatus
+    mm2s: AxiDmaChannelStatus
+    s2mm_current_descriptor: int
+    s2mm_tail_descriptor: int
+
+    @classmethod
+    def decode(cls, block: np.ndarray):
+        """block: the registers from MM2S_DMACR to S2MM_LENGTH"""
+        def register(addr):
+            return int(block[addr >> 2])
+
+        s2mm = AxiDmaChannelStatus.decode(register(AxiDmaDevice.S2MM_DMACR), register(AxiDmaDevice.S2MM_DMASR))
+        mm2s = AxiDmaChannelStatus.decode(register(AxiDmaDevice.MM2S_DMACR), register(AxiDmaDevice.MM2S_DMASR))
+        return cls(register(AxiDmaDevice.S2MM_DMACR) != 0, register(AxiDmaDevice.MM2S_DMACR) != 0,
+                   s2mm.sg_included or mm2s.sg_included, s2mm, mm2s,
+                   register(AxiDmaDevice.S2MM_CURDESC), register(AxiDmaDevice.S2MM_TAILDESC))
+
+    def show_info(self):
+        print("\nAXI DMA info:")
+        print(f"\ts2mm enabled: {self.s2mm_enabled}")
+        print(f"\tm2ss_enabled: {self.mm2s_enabled}")
+        print(f"\tusing Scatter Gather: {self.sg_enabled}")
+        print(f"\nS2MM channel info:")
+        self.s2mm.show_info(self.sg_enabled)
+        print(f"\nMM2S channel info:")
+        self.mm2s.show_info(self.sg_enabled)
+
+
 class AxiDmaDevice(XdmaDeviceFile):
     # register list
     # M2SS
@@ -114,12 +183,23 @@ class AxiDmaDevice(XdmaDeviceFile):
     S2MM_DA_MSB = 0x4C
     S2MM_LENGTH = 0x58
 
+    # DMACR is volatile as well: the core clears RS on errors and Reset when the reset is done
+    STABLE_REGISTERS = frozenset({MM2S_CURDESC_MSB, MM2S_TAILDESC, MM2S_TAILDESC_MSB, MM2S_SA, MM2S_DA, SG_CTL,
+                                  S2MM_CURDESC_MSB, S2MM_TAILDESC, S2MM_TAILDESC_MSB, S2MM_DA, S2MM_DA_MSB})
+    VOLATILE_REGISTERS = frozenset({MM2S_DMACR, MM2S_DMASR, MM2S_CURDESC, MM2S_LENGTH,
+                                    S2MM_DMACR, S2MM_DMASR, S2MM_CURDESC, S2MM_LENGTH})
     #
 
     # TODO: get length maximum
 
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address)
+        self.sg_included = None  # DMASR.SGIncld, fixed when the core is built, kept while the shadow cache is enabled
+
+    def invalidate_shadow(self, addr: int = None):
+        super().invalidate_shadow(addr)
+        if addr is None:
+            self.sg_included = None
 
     def is_m2ss_enabled(self):
         return self._read_register(0x00) != 0x0000_0000
@@ -128,23 +208,20 @@ class AxiDmaDevice(XdmaDeviceFile):
         return self._read_register(0x30) != 0x0000_0000
 
     def is_sg_enabled(self):
-        return self.read_register_field(self.S2MM_DMASR, 3, 1) == 1 or self.read_register_field(self.MM2S_DMASR, 3, 1) == 1
-
-    def show_channel_info(self, base_address: int = 0):
-        def get_control(bit: int):
-            return self.read_register_field(base_address, bit, 1) == 1
+        if self.shadow is not None and self.sg_included is not None:
+            return self.sg_included
+        sg_included = self.read_register_field(self.S2MM_DMASR, 3, 1) == 1 or self.read_register_field(self.MM2S_DMASR, 3, 1) == 1
+        if self.shadow is not None:
+            self.sg_included = sg_included
+        return sg_included
 
-        def get_status(bit: int):
-            return self.read_register_field(base_address + 0x04, bit, 1) == 1
+    def read_status(self) -> "AxiDmaStatus":
+        block = self.read_register_block(self.MM2S_DMACR, self.S2MM_LENGTH // 4 + 1)  # one snapshot of both channels
+        return AxiDmaStatus.decode(block)
 
-        print(f"\trunning status:")
-        print(
-            f"\t\treset: {get_control(2)}\n\t\trunning: {get_control(0)}\n\t\thalted: {get_status(0)}\n\t\tidle: {get_status(1)}\n\t\tkeyhole:{get_control(3)}\n\t\tcyclic:{get_control(4)}")
-        if self.is_sg_enabled():
-            print(f"\terror status:")
-            print(f"\t\tsg_internal_error: {get_status(8)}\n\t\tsg_slave_error: {get_status(9)}\n\t\tsg_decode_error: {get_status(10)}")
-        else:
-            print(f"\tdma_internal_error: {get_status(4)}, dma_slave_error: {get_status(5)}, dma_decode_error: {get_status(6)}")
+    def show_channel_info(self, base_address: int = 0):
+        control, status = self.read_register_block(base_address, 2)
+        AxiDmaChannelStatus.decode(control, status).show_info(self.is_sg_enabled())
 
     def show_s2mm_info(self):
         print(f"\nS2MM channel info:")
@@ -155,14 +232,7 @@ class AxiDmaDevice(XdmaDeviceFile):
         self.show_channel_info(self.MM2S_DMACR)
 
     def show_info(self):
-        print("\nAXI DMA info:")
-        print(f"\ts2mm enabled: {self.is_s2mm_enabled()}")
-        print(f"\tm2ss_enabled: {self.is_m2ss_enabled()}")
-        print(f"\tusing Scatter Gather: {self.is_sg_enabled()}")
-        self.show_s2mm_info()
-        self.show_mm2s_info()
-
-        # TODO: running status
+        self.read_status().show_info()
 
     def get_bd_start(self):
         return self.read_register_field(self.S2MM_CURDESC, 0, 32)
@@ -175,6 +245,7 @@ class AxiDmaDevice(XdmaDeviceFile):
             self.write_register_field(self.MM2S_DMACR, 2, 1, 1, strict=False)
         elif self.is_s2mm_enabled():
             self.write_register_field(self.S2MM_DMACR, 2, 1, 1, strict=False)
+        self.invalidate_shadow()  # a reset of either channel resets the whole core
 
     def do_direct_s2mm_operation(self, addr: int, length: int):
         # 1. set S2MM_DMACR.RS = 1
@@ -188,8 +259,10 @@ class AxiDmaDevice(XdmaDeviceFile):
             self._write_register(self.S2MM_DA_MSB, high)
         # 4. write length to S2MM_LENGTH, this operation will start DMA data transfer
         self._write_register(self.S2MM_LENGTH, length)
-        # 5. read S2MM_LENGTH
-        time.sleep(1)
+        # 5. wait for S2MM_DMASR.Idle, set when the transfer completes
+        if not self.wait_until([(self.S2MM_DMASR, 1, 1, 1)], timeout=1.0, label="direct S2MM"):
+            print("S2MM transfer not done")
+        # read S2MM_LENGTH
         # 6. read S2MM_DMACR.RS
         # print(f"S2MM_DMACR.RS = {self.read_register_field(self.S2MM_DMACR, 0, 1)}")
         # print(f"S2MM_DMACR.Halted = {self.read_register_field(self.S2MM_DMASR, 0, 1)}")
@@ -200,24 +273,26 @@ class AxiDmaDevice(XdmaDeviceFile):
     # TODO: sg_enabled
     def do_s2mm_reset(self):
         self.write_register_field(self.S2MM_DMACR, 2, 1, 1, strict=False)
+        self.invalidate_shadow()
 
     def do_sg_s2mm_operation(self, bd_start, bd_end, cyclic: bool = False):
         self.do_s2mm_reset()
         assert bd_start % DESCRIPTOR_GAP == 0 and bd_end % DESCRIPTOR_GAP == 0, "bad alignment"
         cyclic_value = 1 if cyclic else 0
-        self.write_register_field(self.S2MM_DMACR, 0, 1, 0)  # set RS = 0
-        # 1. set starting descriptor
-        # FIXME: writing to CURDESC may failed
-        self.write_register_field(self.S2MM_CURDESC, 6, 26, bd_start // DESCRIPTOR_GAP, strict=False)  # this register is RO when S2MM_DMACR.RS = 1
-        # 2. set S2MM_DMACR.RS = 1, set cyclic
-        self.write_register_field(self.S2MM_DMACR, 0, 1, 1)
-        self.write_register_field(self.S2MM_DMACR, 4, 1, cyclic_value)
-        # 3. enable interrupt if desired
-        # 4. set tail descriptor, this operation will start data transfer
-        if cyclic:
-            self.write_register_field(self.S2MM_TAILDESC, 6, 26, bd_end // DESCRIPTOR_GAP + DESCRIPTOR_GAP)  # this register is RO when S2MM_DMACR.RS = 1
-        else:
-            self.write_register_field(self.S2MM_TAILDESC, 6, 26, bd_end // DESCRIPTOR_GAP)  # this register is RO when S2MM_DMACR.RS = 1
+        with self.batch() as batch:
+            batch.write_field(self.S2MM_DMACR, 0, 1, 0)  # set RS = 0
+            # 1. set starting descriptor
+            # FIXME: writing to CURDESC may failed
+            batch.write_field(self.S2MM_CURDESC, 6, 26, bd_start // DESCRIPTOR_GAP, verify=False)  # this register is RO when S2MM_DMACR.RS = 1
+            # 2. set S2MM_DMACR.RS = 1, set cyclic, merged into one read-modify-write
+            batch.write_field(self.S2MM_DMACR, 0, 1, 1)
+            batch.write_field(self.S2MM_DMACR, 4, 1, cyclic_value)
+            # 3. enable interrupt if desired
+            # 4. set tail descriptor, this operation will start data transfer
+            if cyclic:
+                batch.write_field(self.S2MM_TAILDESC, 6, 26, bd_end // DESCRIPTOR_GAP + DESCRIPTOR_GAP)  # this register is RO when S2MM_DMACR.RS = 1
+            else:
+                batch.write_field(self.S2MM_TAILDESC, 6, 26, bd_end // DESCRIPTOR_GAP)  # this register is RO when S2MM_DMACR.RS = 1
         # even when the CURDESC value is wrong, as long as it satisfies the following condition, it may still work on cyclic BDs located on incremental address
         success = bd_end >= self.get_bd_start() >= bd_start and bd_start % DESCRIPTOR_GAP == 0 and self.read_register_field(self.S2MM_DMACR, 0, 1) == 1
         print(f"SG_S2MM启动完毕")
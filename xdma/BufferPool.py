@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 21:30
+# @Author  : DAS
+# @Site    :
+# @File    : BufferPool.py
+# @Software: PyCharm
+# @Comment : page-aligned, pre-faulted and recycled NumPy buffers for DMA
+
+import mmap
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+HUGE_PAGE_SIZE = 2 << 20
+MAP_HUGETLB = getattr(mmap, 'MAP_HUGETLB', 0x40000)  # not exported by every Python version, value of Linux
+DEFAULT_MAX_CACHED_BYTES = 1 << 30
+
+
+class BufferPool:
+    """
+    Hands out ndarrays backed by anonymous mappings, so every buffer is page-aligned, and recycles them by size
+
+    Buffers are pre-faulted when created, the driver then pins resident pages instead of faulting them in during
+    the first transfers. With hugepages = True a buffer is backed by MAP_HUGETLB pages when some are reserved,
+    otherwise by transparent hugepages (MADV_HUGEPAGE), fewer pages to pin for large transfers either way.
+    Released buffers are kept for reuse up to max_cached_bytes.
+    """
+
+    def __init__(self, hugepages: bool = False, max_cached_bytes: int = DEFAULT_MAX_CACHED_BYTES):
+        self.hugepages = hugepages
+        self.granularity = HUGE_PAGE_SIZE if hugepages else mmap.PAGESIZE
+        self.max_cached_bytes = max_cached_bytes
+        self.free_blocks = {}  # size -> [mmap], released blocks ready for reuse
+        self.used_blocks = {}  # address -> (size, mmap) of blocks handed out
+        self.cached_bytes = 0
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _new_block(self, size: int) -> mmap.mmap:
+        flags = mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS | getattr(mmap, 'MAP_POPULATE', 0)
+        if self.hugepages:
+            try:
+                return mmap.mmap(-1, size, flags | MAP_HUGETLB)
+            except OSError:
+                pass  # no hugepages reserved, fall back to transparent hugepages
+        block = mmap.mmap(-1, size, flags)
+        if self.hugepages and hasattr(mmap, 'MADV_HUGEPAGE'):
+            block.madvise(mmap.MADV_HUGEPAGE)
+        if not hasattr(mmap, 'MAP_POPULATE'):
+            np.frombuffer(block, dtype=np.uint8)[::mmap.PAGESIZE] = 0  # pre-fault by touching every page
+        return block
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        nbytes = max(count * dtype.itemsize, 1)
+        size = -(-nbytes // self.granularity) * self.granularity
+        with self.lock:
+            blocks = self.free_blocks.get(size)
+            if blocks:
+                block = blocks.pop()
+                self.cached_bytes -= size
+                self.hits += 1
+            else:
+                block = None
+                self.misses += 1
+        if block is None:
+            block = self._new_block(size)
+        array = np.frombuffer(block, dtype=dtype, count=count).reshape(shape)
+        with self.lock:
+            self.used_blocks[array.ctypes.data] = (size, block)
+            self.used_bytes += size
+        return array
+
+    def release(self, array: np.ndarray):
+        with self.lock:
+            size, block = self.used_blocks.pop(array.ctypes.data)
+            self.used_bytes -= size
+            if self.cached_bytes + size <= self.max_cached_bytes:
+                self.free_blocks.setdefault(size, []).append(block)
+                self.cached_bytes += size
+            # otherwise the mapping goes away with the last array referring to it
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        array = self.acquire(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.release(array)
+
+    def clear(self):
+        with self.lock:
+            self.free_blocks.clear()
+            self.cached_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / requests if requests else 0.0,
+                    "used_bytes": self.used_bytes, "cached_bytes": self.cached_bytes,
+                    "resident_bytes": self.used_bytes + self.cached_bytes}
+
+    def show_info(self):
+        stats = self.stats()
+        print(f"\tbuffer pool hit rate: {stats['hit_rate']:.2%} ({stats['hits']} / {stats['hits'] + stats['misses']})")
+        print(f"\tresident: {stats['resident_bytes'] >> 10}KB, in use {stats['used_bytes'] >> 10}KB, "
+              f"cached {stats['cached_bytes'] >> 10}KB")
+
+
+dma_buffer_pool = BufferPool()
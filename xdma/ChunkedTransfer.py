@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 11:05
+# @Author  : DAS
+# @Site    :
+# @File    : ChunkedTransfer.py
+# @Software: PyCharm
+# @Comment : split large DMA transfers into chunks and resume after short transfers
+
+import time
+from dataclasses import dataclass, field
+
+from xdma.FileOperations import *
+
+DEFAULT_CHUNK_SIZE = 8 << 20
+MAX_CHUNK_SIZE = 0x7FFF_F000  # Linux caps a single read/write here, and it fits the c_uint32 length of ReadFile/WriteFile
+MAX_STALLS = 3  # consecutive zero-byte transfers before giving up, e.g. an idle AXI ST channel or end of file
+
+
+@dataclass
+class ChunkRecord:
+    offset: int  # byte offset inside the buffer
+    nbytes: int  # bytes actually transferred, less than requested for a short transfer
+    requested: int
+    seconds: float
+
+    @property
+    def throughput(self):
+        """MB/s"""
+        return self.nbytes / (1 << 20) / self.seconds if self.seconds > 0 else float('inf')
+
+
+@dataclass
+class TransferReport:
+    requested: int
+    transferred: int = 0
+    seconds: float = 0.0
+    chunks: list[ChunkRecord] = field(default_factory=list)
+
+    @property
+    def complete(self):
+        return self.transferred == self.requested
+
+    @property
+    def throughput(self):
+        """MB/s"""
+        return self.transferred / (1 << 20) / self.seconds if self.seconds > 0 else float('inf')
+
+    def show_info(self):
+        short_count = sum(1 for chunk in self.chunks if chunk.nbytes != chunk.requested)
+        print(f"{self.transferred} / {self.requested} bytes in {len(self.chunks)} chunks ({short_count} short), "
+              f"{self.throughput:.1f} MB/s")
+        for chunk in self.chunks:
+            print(f"\t@ {hex(chunk.offset)}: {chunk.nbytes} / {chunk.requested} bytes, {chunk.throughput:.1f} MB/s")
+
+
+class ChunkedTransfer:
+    """
+    Moves a buffer of any size in chunks of at most chunk_size bytes
+
+    A short transfer is continued from the first missing byte, completed bytes are never transferred again.
+    With offset >= 0 every chunk is positional (pread/pwrite), otherwise the handle is used sequentially (AXI ST).
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, max_stalls: int = MAX_STALLS):
+        assert 0 < chunk_size <= MAX_CHUNK_SIZE, "bad chunk size"
+        assert max_stalls > 0
+        self.chunk_size = chunk_size
+        self.max_stalls = max_stalls
+
+    def read(self, handle, buf: np.ndarray, offset: int = -1) -> TransferReport:
+        assert buf.flags.c_contiguous, "chunked read needs a C-contiguous buffer"
+        return self._run(handle, buf.reshape(-1).view(np.uint8), offset, read_from_handle, pread_from_handle)
+
+    def write(self, handle, buf: np.ndarray, offset: int = -1) -> TransferReport:
+        buf = np.ascontiguousarray(buf)
+        return self._run(handle, buf.reshape(-1).view(np.uint8), offset, write_to_handle, pwrite_to_handle)
+
+    def _run(self, handle, view: np.ndarray, offset: int, sequential, positional) -> TransferReport:
+        report = TransferReport(requested=view.nbytes)
+        stalls = 0
+        start = time.perf_counter()
+        while report.transferred < view.nbytes and stalls < self.max_stalls:
+            position = report.transferred
+            requested = min(self.chunk_size, view.nbytes - position)
+            chunk = view[position:position + requested]
+            chunk_start = time.perf_counter()
+            if offset >= 0:
+                done = positional(handle, chunk, requested, offset + position, verbose=False)
+            else:
+                done = sequential(handle, chunk, requested, verbose=False)
+            report.chunks.append(ChunkRecord(position, done, requested, time.perf_counter() - chunk_start))
+            report.transferred += done
+            stalls = stalls + 1 if done == 0 else 0
+        report.seconds = time.perf_counter() - start
+        return report
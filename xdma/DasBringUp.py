@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 14:30
+# @Author  : DAS
+# @Site    :
+# @File    : DasBringUp.py
+# @Software: PyCharm
+# @Comment : dependency-aware bring-up of the DAS chain, HMC7044 -> AD9695 -> JESD204(C), independent steps in parallel
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable
+
+from xdma.Ad9695Driver import Ad9695Driver
+from xdma.Hmc7044Driver import Hmc7044Driver
+from xdma.Jesd204CDriver import Jesd204CDriver
+from xdma.Jesd204Driver import Jesd204Driver
+from xdma.Jesd204PhyDriver import Jesd204PhyDriver
+from xdma.RegisterWait import collect_waits
+from xdma.XdmaDeviceFile import *
+
+DEFAULT_PHY_TIMEOUT = 1.0  # GT PLL lock and RX reset after the reference clock is up
+DEFAULT_SYNC_TIMEOUT = 1.0  # JESD204B link sync after the ADC starts sending
+
+
+@dataclass
+class BringUpStep:
+    name: str
+    action: Callable  # returns False on failure, None or True otherwise
+    depends: tuple[str, ...] = ()
+    gate: Callable = None  # checked after the action, init_done (returns False) or check_status (raises) style
+
+
+@dataclass
+class StepTiming:
+    name: str
+    start: float  # seconds since the start of the bring-up
+    seconds: float
+    passed: bool
+    error: str = ""  # failed action or gate, or the dependency which failed
+    skipped: bool = False
+    waits: list[WaitResult] = field(default_factory=list)  # every wait_until issued by the action and the gate
+
+    @property
+    def end(self):
+        return self.start + self.seconds
+
+    def show_info(self):
+        state = "passed" if self.passed else f"skipped ({self.error})" if self.skipped else f"FAILED ({self.error})"
+        print(f"\t{self.name:<12} {self.start * 1000:9.1f} ms -> {self.end * 1000:9.1f} ms  {self.seconds * 1000:9.1f} ms  {state}")
+        for wait_result in self.waits:
+            print(f"\t\t{wait_result}")
+
+
+@dataclass
+class BringUpReport:
+    steps: list[StepTiming] = field(default_factory=list)  # in completion order
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return all(step.passed for step in self.steps)
+
+    def __getitem__(self, name: str) -> StepTiming:
+        return next(step for step in self.steps if step.name == name)
+
+    def show_info(self):
+        print(f"\nDAS bring-up {'done' if self.ok else 'FAILED'} in {self.seconds * 1000:.1f} ms, "
+              f"sequential time {sum(step.seconds for step in self.steps) * 1000:.1f} ms:")
+        for step in sorted(self.steps, key=lambda step: step.start):
+            step.show_info()
+
+
+class DasBringUp:
+    """
+    Brings the DAS chain up as a graph of steps, a step starts as soon as the steps it depends on have passed
+
+        clock      HMC7044 init_for_das, gated by check_status
+        adc        AD9695 init_for_das, after clock, gated by check_status
+        phy        wait for the GT PLL lock and RX reset, after clock, gated by init_done
+        JESD204B:
+        jesd       register setup, independent of the clock, runs while clock and adc configure
+        link       wait for link sync, after adc, phy and jesd, gated by init_done
+        JESD204C:
+        jesd       configuration and soft reset, after adc and phy (the GT reset needs the reference clock), gated by init_done
+
+    A step whose action or gate fails makes its dependents skipped, the others go on. add_step extends the graph.
+
+        report = DasBringUp(hmc7044, ad9695, jesd204c, phy).run()
+        report.show_info()
+    """
+
+    def __init__(self, hmc7044: Hmc7044Driver, ad9695: Ad9695Driver, jesd: Jesd204Driver | Jesd204CDriver,
+                 phy: Jesd204PhyDriver = None, use_external_clk: bool = True, startup_mode: str = "normal",
+                 verify: str = 'end', diff: bool = False):
+        """diff = True re-initializes through the incremental sequences, see RegisterSequence.run"""
+        self.steps: dict[str, BringUpStep] = {}
+        self.add_step(BringUpStep("clock", lambda: hmc7044.init_for_das(use_external_clk, verify, diff),
+                                  gate=hmc7044.check_status))
+        self.add_step(BringUpStep("adc", lambda: ad9695.init_for_das(startup_mode, verify, diff), ("clock",),
+                                  gate=ad9695.check_status))
+        link_depends = ("adc",)
+        if phy is not None:
+            self.add_step(BringUpStep("phy", lambda: phy.wait_until(phy.rx_ready_conditions(), DEFAULT_PHY_TIMEOUT,
+                                                                    label="PHY RX ready"),
+                                      ("clock",), gate=phy.init_done))
+            link_depends += ("phy",)
+        if isinstance(jesd, Jesd204CDriver):
+            self.add_step(BringUpStep("jesd", lambda: jesd.init_for_das(diff), link_depends, gate=jesd.init_done))
+        else:
+            self.add_step(BringUpStep("jesd", lambda: jesd.init_for_das(diff)))
+            self.add_step(BringUpStep("link", lambda: jesd.wait_until(jesd.LINK_SYNC, DEFAULT_SYNC_TIMEOUT, label="JESD204B sync"),
+                                      link_depends + ("jesd",), gate=jesd.init_done))
+
+    def add_step(self, step: BringUpStep):
+        for dependency in step.depends:
+            assert dependency in self.steps, f"{step.name}: unknown dependency {dependency}"  # keeps the graph acyclic
+        self.steps[step.name] = step
+        return self
+
+    def _run_step(self, step: BringUpStep, start: float) -> StepTiming:
+        timing = StepTiming(step.name, time.perf_counter() - start, 0.0, False)
+        # every step runs in its own worker thread, steps on one device never see each other's waits
+        with collect_waits() as timing.waits:
+            try:
+                if step.action() is False:
+                    timing.error = "action failed"
+                elif step.gate is not None and step.gate() is False:
+                    timing.error = "gate not passed"
+                else:
+                    timing.passed = True
+            except Exception as e:
+                timing.error = f"{type(e).__name__}: {e}"
+        timing.seconds = time.perf_counter() - start - timing.start
+        return timing
+
+    def run(self, max_workers: int = None) -> BringUpReport:
+        report = BringUpReport()
+        done: dict[str, StepTiming] = {}
+        pending = dict(self.steps)
+        running = {}  # future -> step name
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.steps), thread_name_prefix="bring-up") as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    failed = next((dependency for dependency in step.depends
+                                   if dependency in done and not done[dependency].passed), None)
+                    if failed is not None:
+                        done[name] = StepTiming(name, time.perf_counter() - start, 0.0, False, f"{failed} failed", True)
+                        report.steps.append(done[name])
+                        del pending[name]
+                    elif all(dependency in done for dependency in step.depends):
+                        running[executor.submit(self._run_step, step, start)] = name
+                        del pending[name]
+                if not running:
+                    continue  # skipped steps may have unblocked others
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    timing = future.result()
+                    done[running.pop(future)] = timing
+                    report.steps.append(timing)
+        report.seconds = time.perf_counter() - start
+        return report
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 18:05
+# @Author  : DAS
+# @Site    :
+# @File    : DdrDump.py
+# @Software: PyCharm
+# @Comment : parallel, resumable dump and restore of card DDR to/from memory-mapped files
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from xdma.ChunkedTransfer import ChunkRecord
+from xdma.XdmaDeviceFile import *
+
+DEFAULT_DUMP_CHUNK_SIZE = 16 << 20
+
+
+class DdrDump:
+    """
+    Moves an AXI MM region between the card and a file, chunk by chunk
+
+    Every chunk is transferred with positional I/O straight into/out of its own short-lived np.memmap of the file, so
+    peak RSS is about workers * chunk_size whatever the region size. Workers handle disjoint chunks, in parallel on
+    Linux, serialized by the synchronous device handle on Windows.
+    Completed chunks are recorded in <path>.progress, an interrupted dump/restore skips them when run again.
+    """
+
+    def __init__(self, device: XdmaDeviceFile, chunk_size: int = DEFAULT_DUMP_CHUNK_SIZE, workers: int = 4):
+        assert chunk_size > 0 and workers > 0
+        self.device = device
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    @staticmethod
+    def progress_path(path: str):
+        return f"{path}.progress"
+
+    def _load_progress(self, path: str, header: dict) -> set:
+        try:
+            with open(self.progress_path(path)) as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if progress.get("header") != header:
+            print(f"progress of {path} belongs to another region, starting over")
+            return set()
+        return set(progress["done"])
+
+    def _save_progress(self, path: str, header: dict, done: set):
+        # caller holds self.lock, written by rename so an interruption never leaves a truncated file
+        temp_path = f"{self.progress_path(path)}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"header": header, "done": sorted(done)}, f)
+        os.replace(temp_path, self.progress_path(path))
+
+    def _run(self, direction: str, path: str, addr: int, size: int, resume: bool):
+        header = {"direction": direction, "base_address": self.device.base_address, "addr": addr, "size": size,
+                  "chunk_size": self.chunk_size}
+        chunk_count = (size + self.chunk_size - 1) // self.chunk_size
+        done = self._load_progress(path, header) if resume else set()
+        pending = [index for index in range(chunk_count) if index not in done]
+        report = TransferReport(requested=sum(min(self.chunk_size, size - index * self.chunk_size) for index in pending))
+        self.stop_event.clear()
+
+        def transfer_chunk(index: int):
+            if self.stop_event.is_set():
+                return
+            start = index * self.chunk_size
+            nbytes = min(self.chunk_size, size - start)
+            chunk = np.memmap(path, dtype=np.uint8, mode='r+' if direction == "dump" else 'r', offset=start, shape=(nbytes,))
+            chunk_start = time.perf_counter()
+            try:
+                if direction == "dump":
+                    transferred = self.device.read_at(addr + start, chunk)
+                    chunk.flush()
+                else:
+                    transferred = self.device.write_at(addr + start, chunk)
+            except BaseException:
+                self.stop_event.set()  # the other workers start no new chunk
+                raise
+            finally:
+                del chunk  # unmapped right away, pages of finished chunks do not stay resident
+            with self.lock:
+                report.chunks.append(ChunkRecord(start, transferred, nbytes, time.perf_counter() - chunk_start))
+                report.transferred += transferred
+                if transferred == nbytes:
+                    done.add(index)
+                    self._save_progress(path, header, done)
+
+        start_time = time.perf_counter()
+        try:
+            with self.device, ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(transfer_chunk, index) for index in pending]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # before leaving the with block, whose shutdown would wait for every queued chunk:
+                    # running chunks finish, chunks not started yet are left for the next run
+                    self.stop_event.set()
+                    executor.shutdown(cancel_futures=True)
+                    raise
+        finally:
+            report.seconds = time.perf_counter() - start_time
+        if len(done) == chunk_count and os.path.exists(self.progress_path(path)):
+            os.remove(self.progress_path(path))
+        print(f"{direction} {path}: {chunk_count - len(pending)} chunks already done, "
+              f"{len(done) - (chunk_count - len(pending))} / {len(pending)} transferred, {report.throughput:.1f} MB/s")
+        return report
+
+    def _region_size(self, addr: int, size: int):
+        return self.device.max_address - self.device.base_address - addr if size is None else size
+
+    def dump(self, path: str, addr: int = 0, size: int = None, resume: bool = True) -> TransferReport:
+        """
+        Copy [addr, addr + size) of the card into path, size defaults to the rest of the device capacity
+        """
+        size = self._region_size(addr, size)
+        self.device._checked_offset(addr, size)
+        if not (resume and os.path.exists(path) and os.path.getsize(path) == size):
+            with open(path, "wb") as f:
+                f.truncate(size)  # sparse until the chunks arrive
+            if os.path.exists(self.progress_path(path)):
+                os.remove(self.progress_path(path))
+        return self._run("dump", path, addr, size, resume)
+
+    def restore(self, path: str, addr: int = 0, resume: bool = True) -> TransferReport:
+        """
+        Copy the content of path back to the card at addr
+        """
+        size = os.path.getsize(path)
+        self.device._checked_offset(addr, size)
+        return self._run("restore", path, addr, size, resume)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # regular file standing in for the card DDR
+    with tempfile.NamedTemporaryFile() as stand_in_file, tempfile.TemporaryDirectory() as dump_directory:
+        stand_in_file.write(np.random.randint(0, 256, size=256 << 20, dtype=np.uint8).tobytes())
+        stand_in_file.flush()
+        ddr = XdmaDeviceFile(stand_in_file.name, stand_in_file.name, 0, 256 << 20)
+        dump_path = os.path.join(dump_directory, "ddr.bin")
+        DdrDump(ddr, workers=4).dump(dump_path).show_info()
+        DdrDump(ddr, workers=4).restore(dump_path, 0).show_info()
+
+        # a failure stops the dump, the resumed run only transfers the chunks left
+        failing = DdrDump(ddr, chunk_size=4 << 20, workers=1)
+        read_at = ddr.read_at
+        calls = []
+
+        def failing_read_at(addr, buffer):
+            calls.append(addr)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return read_at(addr, buffer)
+
+        ddr.read_at = failing_read_at
+        try:
+            failing.dump(dump_path, resume=False)
+        except KeyboardInterrupt:
+            pass
+        assert len(calls) == 2, f"{len(calls)} chunks started after the failure"
+        del ddr.read_at
+        report = failing.dump(dump_path)
+        assert len(report.chunks) == 63 and report.complete
+        with open(dump_path, "rb") as dumped:
+            stand_in_file.seek(0)
+            assert dumped.read() == stand_in_file.read()
+        print("interrupted dump: passed")
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 9:20
+# @Author  : DAS
+# @Site    :
+# @File    : DmaBenchmark.py
+# @Software: PyCharm
+# @Comment : DMA bandwidth and latency benchmark suite
+
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass, asdict, fields
+
+from xdma.XdmaDeviceFile import *
+
+DEFAULT_BLOCK_SIZES = [4 << 10, 64 << 10, 1 << 20, 8 << 20]
+DEFAULT_QUEUE_DEPTHS = [1, 2, 4]
+DEFAULT_BYTES_PER_CASE = 256 << 20
+MIN_TRANSFERS_PER_WORKER = 16
+START_TIMEOUT = 60.0  # seconds for every worker to get its buffer and reach the start barrier
+DEFAULT_TOLERANCE = 0.1  # relative change reported as a regression when comparing against a baseline
+
+
+@dataclass
+class BenchmarkResult:
+    mode: str  # 'mm': positional AXI MM transfers, 'stream': AXI ST transfers
+    direction: str  # 'c2h' or 'h2c'
+    concurrent: bool  # measured while the other direction was running
+    block_size: int
+    queue_depth: int  # transfers in flight, one worker thread each
+    transfers: int
+    bytes: int
+    seconds: float
+    throughput: float  # MB/s
+    latency_p50: float  # us per transfer
+    latency_p90: float
+    latency_p99: float
+    latency_max: float
+
+    def key(self):
+        return self.mode, self.direction, self.concurrent, self.block_size, self.queue_depth
+
+    def __str__(self):
+        return (f"{self.mode:6s} {self.direction}{'*' if self.concurrent else ' '} {self.block_size >> 10:>6d}KB x{self.queue_depth}: "
+                f"{self.throughput:10.1f} MB/s, latency p50/p90/p99/max = {self.latency_p50:.1f}/{self.latency_p90:.1f}/"
+                f"{self.latency_p99:.1f}/{self.latency_max:.1f} us")
+
+
+class DmaBenchmark:
+    """
+    Sweeps block sizes and queue depths over both directions, separately and concurrently, in AXI MM and AXI ST mode
+
+    mm_device is used with read_at/write_at over region_size bytes, each worker on its own addresses; stream_device with
+    read_stream/write_stream. Without a card, a file on tmpfs stands in for the AXI MM device and /dev/zero, /dev/null
+    for the AXI ST channels (see stand_in).
+    """
+
+    def __init__(self, mm_device: XdmaDeviceFile = None, stream_device: XdmaDeviceFile = None,
+                 region_size: int = 64 << 20, bytes_per_case: int = DEFAULT_BYTES_PER_CASE):
+        self.devices = {"mm": mm_device, "stream": stream_device}
+        self.region_size = region_size
+        self.bytes_per_case = bytes_per_case
+
+    @staticmethod
+    def stand_in(directory: str = "/dev/shm", region_size: int = 64 << 20):
+        path = os.path.join(directory, f"xdma_benchmark_{os.getpid()}.bin")
+        with open(path, "wb") as f:
+            f.truncate(region_size)
+        return (XdmaDeviceFile(path, path, 0, region_size),
+                XdmaDeviceFile(read_device_file_path="/dev/zero", write_device_file_path="/dev/null"), path)
+
+    def _worker(self, mode: str, direction: str, worker: int, block_size: int, queue_depth: int, transfers: int,
+                latencies: np.ndarray, transferred: list, finished: list, barrier: threading.Barrier, errors: list):
+        device = self.devices[mode]
+        slots = max(self.region_size // block_size, 1)
+        try:
+            with dma_buffer_pool.borrow(block_size) as buffer:
+                barrier.wait()
+                total = 0
+                for i in range(transfers):
+                    addr = ((i * queue_depth + worker) % slots) * block_size
+                    start = time.perf_counter_ns()
+                    if mode == "mm":
+                        total += device.read_at(addr, buffer) if direction == "c2h" else device.write_at(addr, buffer)
+                    else:
+                        total += device.read_stream(buffer) if direction == "c2h" else device.write_stream(buffer)
+                    latencies[i] = time.perf_counter_ns() - start
+                transferred[worker] = total
+                finished[worker] = time.perf_counter()
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()  # releases the main thread and the other workers instead of leaving them at the barrier
+
+    def run_case(self, mode: str, directions: list[str], block_size: int, queue_depth: int) -> list[BenchmarkResult]:
+        device = self.devices[mode]
+        transfers = max(self.bytes_per_case // block_size // queue_depth, MIN_TRANSFERS_PER_WORKER)
+        barrier = threading.Barrier(len(directions) * queue_depth + 1)
+        errors = []  # exceptions of the workers
+        runs = []
+        for direction in directions:
+            latencies = np.zeros((queue_depth, transfers), dtype=np.int64)
+            transferred = [0] * queue_depth
+            finished = [0.0] * queue_depth
+            threads = [threading.Thread(target=self._worker, args=(mode, direction, worker, block_size, queue_depth, transfers,
+                                                                    latencies[worker], transferred, finished, barrier,
+                                                                    errors))
+                       for worker in range(queue_depth)]
+            runs.append((direction, latencies, transferred, finished, threads))
+        with device:
+            for run in runs:
+                for thread in run[-1]:
+                    thread.start()
+            try:
+                barrier.wait(timeout=START_TIMEOUT)
+            except threading.BrokenBarrierError:
+                barrier.abort()  # a timeout only breaks the barrier for the waiting threads, none may start late
+            start = time.perf_counter()
+            for run in runs:
+                for thread in run[-1]:
+                    thread.join()
+        if errors or barrier.broken:
+            # the cause, the other errors are workers released from the broken barrier
+            failure = next((e for e in errors if not isinstance(e, threading.BrokenBarrierError)), None)
+            raise failure or TimeoutError(f"workers not started within {START_TIMEOUT} s")
+        results = []
+        for direction, latencies, transferred, finished, _ in runs:
+            seconds = max(finished) - start
+            percentiles = np.percentile(latencies, [50, 90, 99, 100]) / 1000
+            results.append(BenchmarkResult(mode, direction, len(directions) > 1, block_size, queue_depth,
+                                           latencies.size, sum(transferred), seconds,
+                                           sum(transferred) / (1 << 20) / seconds, *map(float, percentiles)))
+        return results
+
+    def sweep(self, block_sizes=None, queue_depths=None, modes=None, concurrent: bool = True) -> list[BenchmarkResult]:
+        block_sizes = block_sizes or DEFAULT_BLOCK_SIZES
+        queue_depths = queue_depths or DEFAULT_QUEUE_DEPTHS
+        modes = modes or [mode for mode, device in self.devices.items() if device is not None]
+        results = []
+        for mode in modes:
+            device = self.devices[mode]
+            directions = [direction for direction, exists in (("c2h", device.read_exists()), ("h2c", device.write_exists())) if exists]
+            direction_sets = [[direction] for direction in directions]
+            if concurrent and len(directions) == 2:
+                direction_sets.append(directions)
+            for block_size in block_sizes:
+                for queue_depth in queue_depths:
+                    for direction_set in direction_sets:
+                        for result in self.run_case(mode, direction_set, block_size, queue_depth):
+                            print(result)
+                            results.append(result)
+        return results
+
+
+####################
+# Result files
+####################
+
+def save_json(results: list[BenchmarkResult], path: str, metadata: dict = None):
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata or {}, "results": [asdict(result) for result in results]}, f, indent=2)
+
+
+def load_json(path: str) -> list[BenchmarkResult]:
+    with open(path) as f:
+        return [BenchmarkResult(**result) for result in json.load(f)["results"]]
+
+
+def save_csv(results: list[BenchmarkResult], path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(BenchmarkResult)])
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+
+
+def compare(results: list[BenchmarkResult], baseline: list[BenchmarkResult], tolerance: float = DEFAULT_TOLERANCE):
+    """
+    Print throughput and p99 latency relative to the baseline, return the cases that regressed beyond tolerance
+    """
+    baseline_by_key = {result.key(): result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_by_key.get(result.key())
+        if reference is None:
+            continue
+        throughput_ratio = result.throughput / reference.throughput if reference.throughput else float('inf')
+        latency_ratio = result.latency_p99 / reference.latency_p99 if reference.latency_p99 else 1.0
+        regressed = throughput_ratio < 1 - tolerance or latency_ratio > 1 + tolerance
+        print(f"{'REGRESSION ' if regressed else ''}{result.mode} {result.direction}{'*' if result.concurrent else ''} "
+              f"{result.block_size >> 10}KB x{result.queue_depth}: throughput {throughput_ratio:.2f}x, p99 latency {latency_ratio:.2f}x")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="XDMA bandwidth and latency benchmark")
+    parser.add_argument("--device-index", type=int, default=None, help="benchmark c2h_0/h2c_0 of this card")
+    parser.add_argument("--stand-in", metavar="DIR", default=None, help="benchmark files in DIR (e.g. /dev/shm) instead of a card")
+    parser.add_argument("--modes", nargs="+", choices=["mm", "stream"], default=None)
+    parser.add_argument("--block-sizes", nargs="+", type=lambda text: int(text, 0), default=DEFAULT_BLOCK_SIZES)
+    parser.add_argument("--queue-depths", nargs="+", type=int, default=DEFAULT_QUEUE_DEPTHS)
+    parser.add_argument("--region-size", type=lambda text: int(text, 0), default=64 << 20)
+    parser.add_argument("--bytes-per-case", type=lambda text: int(text, 0), default=DEFAULT_BYTES_PER_CASE)
+    parser.add_argument("--no-concurrent", action="store_true", help="skip running both directions at once")
+    parser.add_argument("--json", help="write results as JSON")
+    parser.add_argument("--csv", help="write results as CSV")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    stand_in_path = None
+    modes = args.modes
+    if args.device_index is not None:
+        device_path = get_device_paths()[args.device_index]
+        channel = XdmaDeviceFile(f"{device_path}{FILE_SEPERATOR}c2h_0", f"{device_path}{FILE_SEPERATOR}h2c_0", 0,
+                                 args.region_size)
+        # the same channels are AXI MM or AXI ST depending on the IP configuration, --modes selects the meaningful one
+        benchmark = DmaBenchmark(channel, channel, args.region_size, args.bytes_per_case)
+        modes = modes or ["mm"]
+    else:
+        mm_device, stream_device, stand_in_path = DmaBenchmark.stand_in(args.stand_in or "/dev/shm", args.region_size)
+        benchmark = DmaBenchmark(mm_device, stream_device, args.region_size, args.bytes_per_case)
+    try:
+        results = benchmark.sweep(args.block_sizes, args.queue_depths, modes, concurrent=not args.no_concurrent)
+    finally:
+        if stand_in_path is not None:
+            os.remove(stand_in_path)
+    metadata = {"device": "stand-in" if stand_in_path else get_device_paths()[args.device_index],
+                "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.json:
+        save_json(results, args.json, metadata)
+    if args.csv:
+        save_csv(results, args.csv)
+    if args.baseline:
+        sys.exit(1 if compare(results, load_json(args.baseline), args.tolerance) else 0)
@@ -41,6 +41,10 @@ seek_handle = platform_module.seek_handle
 close_handle = platform_module.close_handle
 write_to_handle = platform_module.write_to_handle
 read_from_handle = platform_module.read_from_handle
+pwrite_to_handle = platform_module.pwrite_to_handle
+pread_from_handle = platform_module.pread_from_handle
+writev_to_handle = platform_module.writev_to_handle
+readv_from_handle = platform_module.readv_from_handle
 
 
 ####################
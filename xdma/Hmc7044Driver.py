@@ -10,6 +10,7 @@ import os
 import random
 import time
 
+from xdma.RegisterSequence import RegisterSequence
 from xdma.XdmaSpiController import SpiController
 from xdma.XdmaDeviceFile import *
 
@@ -18,8 +19,15 @@ class Hmc7044Driver(SpiController):
     PLL1_REFERENCE_PRIORITY = 0x0014
     STATUS = 0x007D
 
+    # PLL1_REFERENCE_PRIORITY is left out as exists() tests the SPI path with it
+    STABLE_REGISTERS = frozenset({0x0003, 0x0004, 0x0005, 0x0028, 0x0029, 0x0032, 0x0033, 0x0034, 0x0035, 0x0036})
+    VOLATILE_REGISTERS = frozenset({0x0000, 0x0001, STATUS})
+
+    LOCKED = ((STATUS, 3, 1, 1, 'b'), (STATUS, 2, 1, 1, 'b'))  # PLL1 and PLL2 locked, SYSREF locked
+
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address, 0x4_0000)
+        self.configuration_report = None  # BatchReport of the last init_for_das
 
     def exists(self):
         priority = self.read_byte(self.PLL1_REFERENCE_PRIORITY)
@@ -55,11 +63,12 @@ class Hmc7044Driver(SpiController):
         """
         self.write_byte(0x0000, 0x01)
         self.write_byte(0x0000, 0x00)
+        self.invalidate_shadow()
         time.sleep(0.1)
 
-    def set_gpo(self, gpo_id: int, function: str):
+    def set_gpo(self, gpo_id: int, function: str, batch=None):
         """
-        设置GPIO引脚作为output时的功能和模式
+        设置GPIO引脚作为output时的功能和模式, 给定batch(RegisterBatch或RegisterSequence)时只加入batch
         """
         assert 1 <= gpo_id <= 4, "bad gpo id"
         addr = 0x50 + (gpo_id - 1)
@@ -80,11 +89,15 @@ class Hmc7044Driver(SpiController):
 
         mode_value = 3  # CMOS mode + enable
         config = mode_value + (function_value << 2)
-        self.write_byte(addr, config)
+        if batch is None:
+            self.write_byte(addr, config)
+        else:
+            batch.write(addr, config, verify=False)
 
-    def set_output_channel(self, channel_id: int, high_performance: bool, divider: int, driver_mode: str, driver_impedance: int):
+    def set_output_channel(self, channel_id: int, high_performance: bool, divider: int, driver_mode: str, driver_impedance: int,
+                           batch=None):
         """
-        设置输出通道的频率(通过divider),相位和模式
+        设置输出通道的频率(通过divider),相位和模式, 给定batch(RegisterBatch或RegisterSequence)时只加入batch
         """
         is_pulse_generator = False
         base_addr = 0xC8 + channel_id * 0x0A
@@ -108,90 +121,102 @@ class Hmc7044Driver(SpiController):
                 driver_impedance_value = 3
         mode_config = 1 + (start_up_value << 2) + (1 << 4) + (high_performance_value << 7)
         driver_config = driver_impedance_value + (driver_mode_value << 3)
-        self.set_byte(base_addr, mode_config)
-        self.set_byte(base_addr + 1, divider % 256)
-        self.set_byte(base_addr + 2, divider // 256)
-        self.set_byte(base_addr + 8, driver_config)
+        writes = [(base_addr, mode_config), (base_addr + 1, divider % 256), (base_addr + 2, divider // 256),
+                  (base_addr + 8, driver_config)]
+        if batch is None:
+            for addr, value in writes:
+                self.set_byte(addr, value)
+        else:
+            for addr, value in writes:
+                batch.write(addr, value)
         # print(f"setting channel {channel_id}: {hex(mode_config)}, {hex(driver_config)}")
 
-    def init_for_das(self, use_external_clk: bool = True):
-        print(f"使用外部时钟={use_external_clk}")
+    def das_sequence(self, use_external_clk: bool = True) -> RegisterSequence:
         input_enable = 0x08 if use_external_clk else 0x02
         input_priority = 0x87 if use_external_clk else 0x8d
         input_setting = 0x1c if use_external_clk else 0x0c
 
-        # 1. soft reset
-        self.soft_reset()
+        sequence = RegisterSequence("HMC7044 DAS", 'b')
+        # 1. soft reset, 复位所有寄存器,dividers和FSMs
+        sequence.write(0x0000, 0x01, verify=False, reset=True)
+        sequence.write(0x0000, 0x00, verify=False, reset=True, delay=0.1)
         # 2. 配置各寄存器
-        self.set_byte(0x0001, 0x08)  # mute output drivers
+        sequence.write(0x0001, 0x08, always=True)  # mute output drivers
         # 设置输入/输出
-        self.set_byte(0x0003, 0x2f)  # select VCO > 2.5G
-        self.set_byte(0x0004, 0x7f)  # enable all output channels
-        # self.set_byte(0x0005, 0x0a)  # enable CLKIN1,3. 1 for on-card 10M input, 3 for SSMC 10M input
-        self.set_byte(0x0005, input_enable)  # enable CLKIN3 only
+        sequence.write(0x0003, 0x2f)  # select VCO > 2.5G
+        sequence.write(0x0004, 0x7f)  # enable all output channels
+        # sequence.write(0x0005, 0x0a)  # enable CLKIN1,3. 1 for on-card 10M input, 3 for SSMC 10M input
+        sequence.write(0x0005, input_enable)  # enable CLKIN3 only
         # 将other controls中的参数设为最佳
-        self.set_byte(0x009F, 0x4d)
-        self.set_byte(0x00A0, 0xdf)
-        self.set_byte(0x00A5, 0x06)
-        self.set_byte(0x00A8, 0x06)
-        self.set_byte(0x00B0, 0x04)
+        sequence.write(0x009F, 0x4d)
+        sequence.write(0x00A0, 0xdf)
+        sequence.write(0x00A5, 0x06)
+        sequence.write(0x00A8, 0x06)
+        sequence.write(0x00B0, 0x04)
         # 设置PLL2参数
-        self.set_byte(0x0033, 0x01)  # R2低八位=1
-        self.set_byte(0x0034, 0x00)  # R1高四位
-        self.set_byte(0x0035, 0x1e)  # N2低八位=30
-        self.set_byte(0x0036, 0x00)  # N2高四位
-        self.set_byte(0x0032, 0x01)  # disable frequency doubler
+        sequence.write(0x0033, 0x01)  # R2低八位=1
+        sequence.write(0x0034, 0x00)  # R1高四位
+        sequence.write(0x0035, 0x1e)  # N2低八位=30
+        sequence.write(0x0036, 0x00)  # N2高四位
+        sequence.write(0x0032, 0x01)  # disable frequency doubler
         # 设置PLL1参数
-        self.set_byte(0x0014, input_priority)  # 输入时钟优先级: 3 > 1 > 0 > 2
-        self.set_byte(0x0028, 0x2f)  # 设置PLL1锁定检测,使用计数器,持续2^15周期
-        # self.set_byte(0x001C, 0x01)  # CLK0预分频
-        self.set_byte(0x001D, 0x01)  # CLK1预分频
-        # self.set_byte(0x001E, 0x01)  # CLK2预分频
-        self.set_byte(0x001F, 0x01)  # CLK3预分频
-        self.set_byte(0x0020, 0x0A)  # OSCIN预分频
-        self.set_byte(0x0021, 0x0a)  # R1低八位=10
-        self.set_byte(0x0022, 0x00)  # R2高八位
-        self.set_byte(0x0026, 0x64)  # N1低八位=100
-        self.set_byte(0x0027, 0x00)  # N2高八位
-        self.set_byte(0x0029, input_setting)  # 参考时钟源设置
+        sequence.write(0x0014, input_priority)  # 输入时钟优先级: 3 > 1 > 0 > 2
+        sequence.write(0x0028, 0x2f)  # 设置PLL1锁定检测,使用计数器,持续2^15周期
+        # sequence.write(0x001C, 0x01)  # CLK0预分频
+        sequence.write(0x001D, 0x01)  # CLK1预分频
+        # sequence.write(0x001E, 0x01)  # CLK2预分频
+        sequence.write(0x001F, 0x01)  # CLK3预分频
+        sequence.write(0x0020, 0x0A)  # OSCIN预分频
+        sequence.write(0x0021, 0x0a)  # R1低八位=10
+        sequence.write(0x0022, 0x00)  # R2高八位
+        sequence.write(0x0026, 0x64)  # N1低八位=100
+        sequence.write(0x0027, 0x00)  # N2高八位
+        sequence.write(0x0029, input_setting)  # 参考时钟源设置
         # SYSREF control
-        self.set_byte(0x005C, 0xe8)  # SYSREF setpoint 低八位
-        self.set_byte(0x005D, 0x03)  # SYSREF setpoint 高四位
-        self.set_byte(0x005A, 0x01)  # pulse generator mode = 1 pulse
+        sequence.write(0x005C, 0xe8)  # SYSREF setpoint 低八位
+        sequence.write(0x005D, 0x03)  # SYSREF setpoint 高四位
+        sequence.write(0x005A, 0x01)  # pulse generator mode = 1 pulse
         # 设置input buffers(CLKINx & OSCIN)
-        self.set_byte(0x000A, 0x04)  # disable input buffer for CLKIN0
-        self.set_byte(0x000B, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for CLKIN1
-        self.set_byte(0x000C, 0x04)  # disable input buffer for CLKIN2
-        self.set_byte(0x000D, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for CLKIN3
-        self.set_byte(0x000E, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for OSCIN
+        sequence.write(0x000A, 0x04)  # disable input buffer for CLKIN0
+        sequence.write(0x000B, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for CLKIN1
+        sequence.write(0x000C, 0x04)  # disable input buffer for CLKIN2
+        sequence.write(0x000D, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for CLKIN3
+        sequence.write(0x000E, 0x07)  # enable internal 100 Ω termination & ac coupling input mode for OSCIN
         # 设置GPIx
-        self.set_byte(0x0046, 0x00)
-        self.set_byte(0x0047, 0x00)
-        self.set_byte(0x0048, 0x00)
-        self.set_byte(0x0049, 0x10)  # 设置功能为pulse generator request
+        sequence.write(0x0046, 0x00)
+        sequence.write(0x0047, 0x00)
+        sequence.write(0x0048, 0x00)
+        sequence.write(0x0049, 0x10)  # 设置功能为pulse generator request
         # 设置GPOx
-        self.set_gpo(3, "clkin1 LOS")
-        self.set_gpo(4, "clkin3 LOS")
+        self.set_gpo(3, "clkin1 LOS", sequence)
+        self.set_gpo(4, "clkin3 LOS", sequence)
         # 设置输出通道,包括分频系数,output buffers
-        # self.set_output_channel(2, True, 300, "LVPECL", 100)  # -> debug, 10MHz
-        # self.set_output_channel(3, True, 12 * 16, "LVPECL", 100)  # -> debug, 15.625MHz
+        # self.set_output_channel(2, True, 300, "LVPECL", 100, batch=sequence)  # -> debug, 10MHz
+        # self.set_output_channel(3, True, 12 * 16, "LVPECL", 100, batch=sequence)  # -> debug, 15.625MHz
 
-        self.set_output_channel(4, True, 3, "LVPECL", 100)  # -> ADC, 1000MHz, DCLK
-        self.set_output_channel(5, False, 12 * 16, "LVDS", 0)  # -> ADC, 15.625MHz, SYSREF clock
+        self.set_output_channel(4, True, 3, "LVPECL", 100, batch=sequence)  # -> ADC, 1000MHz, DCLK
+        self.set_output_channel(5, False, 12 * 16, "LVDS", 0, batch=sequence)  # -> ADC, 15.625MHz, SYSREF clock
 
-        self.set_output_channel(0, True, 12, "LVDS", 100)  # -> FPGA, 250MHz, MGT(ref) clock
-        self.set_output_channel(6, True, 12 * 16, "LVDS", 100)  # -> FPGA, 15.625MHz, SYSREF clock
-        self.set_output_channel(7, False, 12, "LVDS", 0)  # -> FPGA, 250MHz, core clock # unused in our clocking scheme
+        self.set_output_channel(0, True, 12, "LVDS", 100, batch=sequence)  # -> FPGA, 250MHz, MGT(ref) clock
+        self.set_output_channel(6, True, 12 * 16, "LVDS", 100, batch=sequence)  # -> FPGA, 15.625MHz, SYSREF clock
+        self.set_output_channel(7, False, 12, "LVDS", 0, batch=sequence)  # -> FPGA, 250MHz, core clock # unused in our clocking scheme
 
-        time.sleep(0.1)
+        sequence.delay(0.1)
         # 3. restart dividers/FSMs
-        self.set_byte(0x0001, 0x0a)
-        self.set_byte(0x0001, 0x08)
-        time.sleep(0.1)
+        sequence.write(0x0001, 0x0a, always=True)
+        sequence.write(0x0001, 0x08, always=True, delay=0.1)
         # 4. reseed request
-        self.set_byte(0x0001, 0x88)
-        time.sleep(1.0)
-        return self.init_done()
+        sequence.write(0x0001, 0x88, always=True, delay=1.0, until=self.LOCKED)
+        return sequence
+
+    def init_for_das(self, use_external_clk: bool = True, verify: str = 'end', diff: bool = False):
+        """
+        diff = True only writes the registers which differ, see RegisterSequence.run, the verification and wait results
+        are kept in configuration_report, a mismatch or a wait timing out fails the initialization
+        """
+        print(f"使用外部时钟={use_external_clk}")
+        self.configuration_report = self.das_sequence(use_external_clk).run(self, diff, verify)
+        return self.configuration_report.ok and self.init_done()
 
     def init_done(self):
         status_byte = self.read_byte(self.STATUS)
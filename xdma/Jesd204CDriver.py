@@ -7,12 +7,16 @@
 # @Comment :
 from email.policy import strict
 
+from dataclasses import dataclass, field
+
+from xdma.Jesd204Driver import Jesd204LaneStatus
+from xdma.RegisterSequence import RegisterSequence
 from xdma.XdmaDeviceFile import *
 
 
 class Jesd204_Config(Register32):
     address = 0x0004
-    field_widths = [4, 12, 1, 1, 1]
+    fields = (("lanes", 4), ("reserved_0", 12), ("is_tx", 1), ("is_64b66b", 1), ("fec_included", 1))
 
     def __init__(self, lanes=0, is_tx=0, is_64b66b=0, fec_included=0):
         self.lanes = lanes
@@ -24,7 +28,9 @@ class Jesd204_Config(Register32):
 
 class Jesd204_ResetStatus(Register32):
     address = 0x0020
-    field_widths = [1, 1, 2, 1, 1, 1, 1, 8, 8, 8]
+    fields = (("reset", 1), ("reset_type", 1), ("reserved_0", 2), ("external_reset_state", 1),
+              ("register_reset_state", 1), ("gt_powergood_busy", 1), ("gt_reset_busy", 1), ("reserved_1", 8),
+              ("gt_pma_reset_busy", 8), ("gt_mst_reset_busy", 8))
 
     def __init__(self, reset=0, reset_type=0, external_reset_state=0, register_reset_state=0, gt_powergood_busy=0,
                  gt_reset_busy=0, gt_pma_reset_busy=0,
@@ -43,7 +49,8 @@ class Jesd204_ResetStatus(Register32):
 
 class Jesd204_8B10BConfig(Register32):
     address = 0x003C
-    field_widths = [8, 5, 3, 1, 1, 1, 1, 4, 8]
+    fields = (("F", 8), ("K", 5), ("reserved_0", 3), ("scrambling", 1), ("ila_support", 1), ("error_report", 1),
+              ("error_counter", 1), ("reserved_1", 4), ("ila_multiframe", 8))
 
     def __init__(self, F=2, K=16, scrambling=1, ila_support=1, error_report=0, error_counter=0, ila_multiframe=4):
         self.F = F - 1
@@ -59,7 +66,7 @@ class Jesd204_8B10BConfig(Register32):
 
 class Jesd204_SysrefConfig(Register32):
     address = 0x0050
-    field_widths = [1, 1, 6, 3, 5, 4]
+    fields = (("always", 1), ("required", 1), ("reserved_0", 6), ("tolerance", 3), ("reserved_1", 5), ("delay", 4))
 
     def __init__(self, always=0, required=0, tolerance=0, delay=0):
         self.always = always
@@ -70,6 +77,118 @@ class Jesd204_SysrefConfig(Register32):
         self.delay = delay
 
 
+@dataclass
+class Jesd204CStatus:
+    is_tx: bool
+    lanes_in_use: int
+    is_64b66b: bool
+    fec_included: bool
+    datapath_only_reset: bool
+    reset_in_progress: bool
+    core_reset_asserted: bool
+    reset_asserted: bool
+    gt_powergood_done: bool
+    gt_reset_done: bool
+    scrambling: bool
+    octets_per_frame: int  # F
+    frames_per_multiframe: int  # K
+    ila_multiframe: int
+    ila_support: bool
+    subclass: int
+    sysref_required_on_resync: bool
+    sysref_always: bool
+    interrupt_pending: bool
+    sysref_captured: bool
+    sysref_error: bool
+    buffer_overflow: bool
+    sync_achieved: bool
+    code_group_sync: bool
+    rx_started: bool
+    alignment_error: bool
+    lanes: list[Jesd204LaneStatus] = field(default_factory=list)
+
+    @classmethod
+    def decode(cls, block: np.ndarray):
+        """block: the registers from VERSION to STAT_STATUS"""
+        def register(reg_type):
+            reg = reg_type()
+            reg.from_value(block[reg.address >> 2])
+            return reg
+
+        config_ip = register(Jesd204_Config)
+        config_8b10b = register(Jesd204_8B10BConfig)
+        config_sysref = register(Jesd204_SysrefConfig)
+        status_reset = register(Jesd204_ResetStatus)
+        status = int(block[Jesd204CDriver.STAT_STATUS >> 2])
+        link_error_status = int(block[Jesd204CDriver.STAT_RX_ERR >> 2])
+        link_debug_status = int(block[Jesd204CDriver.STAT_RX_DEBUG >> 2])
+        return cls(
+            is_tx=config_ip.is_tx == 1,
+            lanes_in_use=config_ip.lanes,
+            is_64b66b=config_ip.is_64b66b == 1,
+            fec_included=config_ip.fec_included == 1,
+            datapath_only_reset=status_reset.reset_type == 1,
+            reset_in_progress=status_reset.reset == 1,
+            core_reset_asserted=status_reset.external_reset_state == 1,
+            reset_asserted=status_reset.register_reset_state == 1,
+            gt_powergood_done=status_reset.gt_powergood_busy == 0,
+            gt_reset_done=status_reset.gt_reset_busy == 0,
+            scrambling=config_8b10b.scrambling == 1,
+            octets_per_frame=config_8b10b.F + 1,
+            frames_per_multiframe=config_8b10b.K + 1,
+            ila_multiframe=config_8b10b.ila_multiframe + 1,
+            ila_support=config_8b10b.ila_support == 1,
+            subclass=get_bits(int(block[Jesd204CDriver.CTRL_SUB_CLASS >> 2]), 0, 2),
+            sysref_required_on_resync=config_sysref.required == 1,
+            sysref_always=config_sysref.always == 1,
+            interrupt_pending=is_bit_set(status, 0),
+            sysref_captured=is_bit_set(status, 1),
+            sysref_error=is_bit_set(status, 2),
+            buffer_overflow=is_bit_set(status, 10),
+            sync_achieved=is_bit_set(status, 12),
+            code_group_sync=is_bit_set(status, 13),
+            rx_started=is_bit_set(status, 14),
+            alignment_error=is_bit_set(status, 15),
+            lanes=[Jesd204LaneStatus.decode(lane_id, link_error_status, link_debug_status)
+                   for lane_id in range(config_ip.lanes)])
+
+    def show_info(self):
+        print("\nJESD204C IP status:")
+        # IP config
+        print(f"\tdirection: {'tx' if self.is_tx else 'rx'}")
+        print(f"\tlane in use: {self.lanes_in_use}")
+        print(f"\tfec: {'64B66B' if self.is_64b66b else '8B10B'}")
+        print(f"\tfec included: {self.fec_included}")
+        # reset status
+        print(f"\n\treset type: {'datapath only' if self.datapath_only_reset else 'include PLL'}")
+        print(f"\treset in progress: {self.reset_in_progress}")
+        print(f"\ttx/rx_core_reset asserted: {self.core_reset_asserted}")
+        print(f"\ttx/rx_reset asserted: {self.reset_asserted}")
+        print(f"\tgt_powergood done: {self.gt_powergood_done}")
+        print(f"\tgt_reset done: {self.gt_reset_done}")
+        # link parameters
+        print(f"\n\tscrambling enabled: {self.scrambling}")
+        print(f"\toctets per frame(F): {self.octets_per_frame}")
+        print(f"\tframes per multiframe(K): {self.frames_per_multiframe}")
+        print(f"\tILA multiframe: {self.ila_multiframe}")
+        print(f"\tILA support enabled: {self.ila_support}")
+        print(f"\tsubclass: {self.subclass}")
+        print(f"\n\tSYSREF Required on Re-Sync: {self.sysref_required_on_resync}")
+        print(f"\tSYSREF Always: {self.sysref_always}")
+        # overall link status
+        print(f"\n\tinterrupt pending: {self.interrupt_pending}")
+        print(f"\tSYSREF captured: {self.sysref_captured}")
+        print(f"\tSYSREF error: {self.sysref_error}")
+        print(f"\tbuffer overflow error: {self.buffer_overflow}")
+        print(f"\t8B10B signaled SYNC has been achieved: {self.sync_achieved}")
+        print(f"\t8B10B Code Group Sync achieved: {self.code_group_sync}")
+        print(f"\t8B10B RX started: {self.rx_started}")
+        print(f"\t8B10B alignment error: {self.alignment_error}")
+        # lane status
+        for lane in self.lanes:
+            lane.show_info()
+
+
 class Jesd204CDriver(XdmaDeviceFile):
     """
 
@@ -83,6 +202,14 @@ class Jesd204CDriver(XdmaDeviceFile):
     STAT_RX_DEBUG = 0x05C
     STAT_STATUS = 0x060
 
+    # reset released, register and GT resets done, see Jesd204_ResetStatus
+    RESET_DONE = ((RESET, 0, 1, 0), (RESET, 5, 3, 0))
+    RESET_SETTLE = 0.01  # RESET_DONE has to hold for this long, busy bits not yet raised after the release are not taken as done
+    LINK_STARTED = ((STAT_STATUS, 14, 1, 1),)
+
+    STABLE_REGISTERS = frozenset({VERSION, CONFIG, CTRL_SUB_CLASS, Jesd204_8B10BConfig.address, Jesd204_SysrefConfig.address})
+    VOLATILE_REGISTERS = frozenset({RESET, STAT_RX_ERR, STAT_RX_DEBUG, STAT_STATUS})
+
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address)
 
@@ -92,76 +219,38 @@ class Jesd204CDriver(XdmaDeviceFile):
         self.write_register_field(self.RESET, 1, 1, 0, strict=False)  # set reset type
         self.write_register_field(self.RESET, 0, 1, 1, strict=False)
         self.write_register_field(self.RESET, 0, 1, 0, strict=False)  # release
-        time.sleep(1.0)
-        # assert not self.check_register_bit(self.RESET, 0), "reset in progress"
+        # the core reset keeps the AXI registers, but a standalone reset usually recovers from an unknown state
+        self.invalidate_shadow()
+        assert self.wait_until(self.RESET_DONE, timeout=1.0, settle=self.RESET_SETTLE, label="JESD204C soft reset"), \
+            "reset in progress"
+
+    def read_status(self) -> "Jesd204CStatus":
+        block = self.read_register_block(self.VERSION, self.STAT_STATUS // 4 + 1)  # one snapshot of the whole register map
+        return Jesd204CStatus.decode(block)
 
     def show_info(self):
-        print("\nJESD204C IP status:")
-        config_ip = Jesd204_Config()
-        self.read_register32(config_ip)
-        config_8b10b = Jesd204_8B10BConfig()
-        self.read_register32(config_8b10b)
-        config_sysref = Jesd204_SysrefConfig()
-        self.read_register32(config_sysref)
-        status_reset = Jesd204_ResetStatus()
-        self.read_register32(status_reset)
-
-        lane_in_use = config_ip.lanes
-        # IP config
-        print(f"\tdirection: {'tx' if (config_ip.is_tx == 1) else 'rx'}")
-        print(f"\tlane in use: {lane_in_use}")
-        print(f"\tfec: {'64B66B' if (config_ip.is_64b66b == 1) else '8B10B'}")
-        print(f"\tfec included: {config_ip.fec_included == 1}")
-        # reset status
-        print(f"\n\treset type: {'include PLL' if (status_reset.reset_type == 0) else 'datapath only'}")
-        print(f"\treset in progress: {status_reset.reset == 1}")
-        print(f"\ttx/rx_core_reset asserted: {status_reset.external_reset_state == 1}")
-        print(f"\ttx/rx_reset asserted: {status_reset.register_reset_state == 1}")
-        print(f"\tgt_powergood done: {status_reset.gt_powergood_busy == 0}")
-        print(f"\tgt_reset done: {status_reset.gt_reset_busy == 0}")
-        # link parameters
-        print(f"\n\tscrambling enabled: {config_8b10b.scrambling == 1}")
-        print(f"\toctets per frame(F): {config_8b10b.F + 1}")
-        print(f"\tframes per multiframe(K): {config_8b10b.K + 1}")
-        print(f"\tILA multiframe: {config_8b10b.ila_multiframe + 1}")
-        print(f"\tILA support enabled: {config_8b10b.ila_support == 1}")
-        print(f"\tsubclass: {self.read_register_field(self.CTRL_SUB_CLASS, 0, 2)}")
-        print(f"\n\tSYSREF Required on Re-Sync: {config_sysref.required == 1}")
-        print(f"\tSYSREF Always: {config_sysref.always == 1}")
-        # overall link status
-        status = self._read_register(self.STAT_STATUS)
-        print(f"\n\tinterrupt pending: {is_bit_set(status, 0)}")
-        print(f"\tSYSREF captured: {is_bit_set(status, 1)}")
-        print(f"\tSYSREF error: {is_bit_set(status, 2)}")
-        print(f"\tbuffer overflow error: {is_bit_set(status, 10)}")
-        print(f"\t8B10B signaled SYNC has been achieved: {is_bit_set(status, 12)}")
-        print(f"\t8B10B Code Group Sync achieved: {is_bit_set(status, 13)}")
-        print(f"\t8B10B RX started: {is_bit_set(status, 14)}")
-        print(f"\t8B10B alignment error: {is_bit_set(status, 15)}")
-        # lane status
-        link_error_status = self._read_register(self.STAT_RX_ERR)
-        link_debug_status = self._read_register(self.STAT_RX_DEBUG)
-
-        for lane_id in range(lane_in_use):
-            error_status = get_bits(link_error_status, lane_id * 3, (lane_id + 1) * 3)
-            debug_status = get_bits(link_debug_status, lane_id * 4, (lane_id + 1) * 4)
-            print(f"\n\tlane {lane_id}: "
-                  f"\n\t\tUnexpected K-character(s) received: {is_bit_set(error_status, 2)}"
-                  f"\n\t\tDisparity Error(s) received: {is_bit_set(error_status, 1)}"
-                  f"\n\t\tNot in Table Error(s) received: {is_bit_set(error_status, 0)}"
-                  f"\n\t\tStart of Data was Detected: {is_bit_set(debug_status, 3)}"
-                  f"\n\t\tStart of ILA was Detected: {is_bit_set(debug_status, 2)}"
-                  f"\n\t\tLane has Code Group Sync: {is_bit_set(debug_status, 1)}"
-                  f"\n\t\tLane is currently receiving K28.5's (BC alignment characters): {is_bit_set(debug_status, 0)}")
-
-    def init_for_das(self):
+        self.read_status().show_info()
+
+    def das_sequence(self) -> RegisterSequence:
         # set link parameters
         config = Jesd204_8B10BConfig(K=32, F=1, scrambling=1)
-        self.write_register32(config)
-        self.soft_reset()  # make parameters take effect
-        # verify
-        time.sleep(0.5)
-        return self.init_done()
+        return (RegisterSequence("JESD204C DAS")
+                .write(config.address, config.to_value(), verify=False)
+                # soft reset, make parameters take effect, needed whenever a parameter changed
+                # always rather than reset: a diff run must pulse it when a parameter changed, reset steps never run in
+                # diff mode, and the core reset (datapath or PLL, bit 1) keeps the AXI configuration registers, so the
+                # shadow cache stays valid across it
+                .write_field(self.RESET, 1, 1, 0, verify=False, always=True)  # set reset type
+                .write_field(self.RESET, 0, 1, 1, verify=False, always=True)
+                .write_field(self.RESET, 0, 1, 0, verify=False, always=True, delay=1.0, until=self.RESET_DONE,
+                             settle=self.RESET_SETTLE))  # release
+
+    def init_for_das(self, diff: bool = False):
+        """diff = True only writes the registers which differ, see RegisterSequence.run"""
+        report = self.das_sequence().run(self, diff)
+        # verify, the link starts shortly after the reset, instead of a fixed 0.5 s
+        report.waits.append(self.wait_until(self.LINK_STARTED, timeout=0.5, label="JESD204C link start"))
+        return report.ok and self.init_done()
 
     def init_done(self):
         status = self._read_register(self.STAT_STATUS)
@@ -6,9 +6,126 @@
 # @Software: PyCharm 
 # @Comment :
 
+from dataclasses import dataclass, field
+
+from xdma.RegisterSequence import RegisterSequence
 from xdma.XdmaDeviceFile import *
 
 
+@dataclass
+class Jesd204LaneStatus:
+    lane_id: int
+    unexpected_k_character: bool
+    disparity_error: bool
+    not_in_table_error: bool
+    start_of_data: bool
+    start_of_ila: bool
+    code_group_sync: bool
+    receiving_k28_5: bool
+
+    @classmethod
+    def decode(cls, lane_id: int, error_status: int, debug_status: int):
+        """lane_id's 3 error bits and 4 debug bits of the link error and debug status registers"""
+        error_status = get_bits(error_status, lane_id * 3, 3)
+        debug_status = get_bits(debug_status, lane_id * 4, 4)
+        return cls(lane_id, is_bit_set(error_status, 2), is_bit_set(error_status, 1), is_bit_set(error_status, 0),
+                   is_bit_set(debug_status, 3), is_bit_set(debug_status, 2), is_bit_set(debug_status, 1),
+                   is_bit_set(debug_status, 0))
+
+    def show_info(self):
+        print(f"\n\tlane {self.lane_id}: "
+              f"\n\t\tUnexpected K-character(s) received: {self.unexpected_k_character}"
+              f"\n\t\tDisparity Error(s) received: {self.disparity_error}"
+              f"\n\t\tNot in Table Error(s) received: {self.not_in_table_error}"
+              f"\n\t\tStart of Data was Detected: {self.start_of_data}"
+              f"\n\t\tStart of ILA was Detected: {self.start_of_ila}"
+              f"\n\t\tLane has Code Group Sync: {self.code_group_sync}"
+              f"\n\t\tLane is currently receiving K28.5's (BC alignment characters): {self.receiving_k28_5}")
+
+
+@dataclass
+class Jesd204Status:
+    reset_in_progress: bool
+    fixed_reset: bool
+    watchdog_enabled: bool
+    version: str
+    ila_support: bool
+    sysref_required_on_resync: bool
+    sysref_always: bool
+    scrambling: bool
+    octets_per_frame: int  # F
+    frames_per_multiframe: int  # K
+    lanes_in_use: list[int]
+    subclass: int
+    rx_buffer_delay: int
+    sysref_captured: bool
+    link_sync: bool
+    lane_alignment_error: bool
+    sysref_lmfc_alarm: bool
+    rx_buffer_overflow: bool
+    lanes: list[Jesd204LaneStatus] = field(default_factory=list)
+
+    @classmethod
+    def decode(cls, block: np.ndarray):
+        """block: the registers from VERSION to DEBUG_STATUS"""
+        def register(addr):
+            return int(block[addr >> 2])
+
+        reset = register(Jesd204Driver.RESET)
+        version = register(Jesd204Driver.VERSION)
+        sysref_handling = register(Jesd204Driver.SYSREF_HANDLING)
+        sync_status = register(Jesd204Driver.SYNC_STATUS)
+        link_error_status = register(Jesd204Driver.LINK_ERROR_STATUS)
+        link_debug_status = register(Jesd204Driver.DEBUG_STATUS)
+        lane_in_use_value = get_bits(register(Jesd204Driver.LANE_IN_USE), 0, 8)
+        lanes_in_use = [lane_id for lane_id in range(8) if is_bit_set(lane_in_use_value, lane_id)]
+        return cls(
+            reset_in_progress=is_bit_set(reset, 0),
+            fixed_reset=is_bit_set(reset, 1),
+            watchdog_enabled=not is_bit_set(reset, 16),
+            version=f"{version >> 24}.{(version >> 16) & 0xF}.{(version >> 8) & 0xF}",
+            ila_support=is_bit_set(register(Jesd204Driver.ILA_SUPPORT), 0),
+            sysref_required_on_resync=is_bit_set(sysref_handling, 16),
+            sysref_always=is_bit_set(sysref_handling, 0),
+            scrambling=is_bit_set(register(Jesd204Driver.SCRAMBLING), 0),
+            octets_per_frame=get_bits(register(Jesd204Driver.OCTETS_PER_FRAME), 0, 8) + 1,
+            frames_per_multiframe=get_bits(register(Jesd204Driver.FRAMES_PER_MULTIFRAME), 0, 8) + 1,
+            lanes_in_use=lanes_in_use,
+            subclass=get_bits(register(Jesd204Driver.SUBCLASS_MODE), 0, 2),
+            rx_buffer_delay=get_bits(register(Jesd204Driver.RX_BUFFER_DELAY), 0, 10),
+            sysref_captured=is_bit_set(sync_status, 16),
+            link_sync=is_bit_set(sync_status, 0),
+            lane_alignment_error=is_bit_set(link_error_status, 31),
+            sysref_lmfc_alarm=is_bit_set(link_error_status, 30),
+            rx_buffer_overflow=is_bit_set(link_error_status, 29),
+            lanes=[Jesd204LaneStatus.decode(lane_id, link_error_status, link_debug_status) for lane_id in lanes_in_use])
+
+    def show_info(self):
+        print("\nJESD204B status:")
+        print(f"\n\tself-clearing reset in progress: {self.reset_in_progress}")
+        print(f"\tfixed reset set: {self.fixed_reset}")
+        print(f"\twatchdog enabled: {self.watchdog_enabled}")
+        print(f"\n\tJESD204B IP version: {self.version}")
+        print(f"\tILA support enabled: {self.ila_support}")
+        print(f"\tSYSREF Required on Re-Sync: {self.sysref_required_on_resync}")
+        print(f"\tSYSREF Always: {self.sysref_always}")
+
+        print(f"\n\tscrambling enabled: {self.scrambling}")
+        print(f"\toctets per frame(F): {self.octets_per_frame}")
+        print(f"\tframes per multiframe(K): {self.frames_per_multiframe}")
+        print(f"\tlane in use(L): {len(self.lanes_in_use)}({self.lanes_in_use})")
+        print(f"\tsubclass: {self.subclass}")
+
+        print(f"\n\tRX Buffer Delay: {self.rx_buffer_delay}")
+        print(f"\tA SYSREF event has been captured: {self.sysref_captured}")
+        print(f"\tLink Sync achieved: {self.link_sync}")
+        print(f"\tLane Alignment Error Detected Alarm: {self.lane_alignment_error}")
+        print(f"\tSYSREF LMFC Alarm: {self.sysref_lmfc_alarm}")
+        print(f"\tRX Buffer Overflow Alarm: {self.rx_buffer_overflow}")
+        for lane in self.lanes:
+            lane.show_info()
+
+
 class Jesd204Driver(XdmaDeviceFile):
     VERSION = 0x000
     RESET = 0x004
@@ -28,65 +145,41 @@ class Jesd204Driver(XdmaDeviceFile):
     SYNC_STATUS = 0x038
     DEBUG_STATUS = 0x03C
 
+    STABLE_REGISTERS = frozenset({VERSION, ILA_SUPPORT, SCRAMBLING, SYSREF_HANDLING, TEST_MODES, OCTETS_PER_FRAME,
+                                  FRAMES_PER_MULTIFRAME, LANE_IN_USE, SUBCLASS_MODE, RX_BUFFER_DELAY, ERROR_REPORTING})
+    VOLATILE_REGISTERS = frozenset({RESET, LINK_ERROR_STATUS, SYNC_STATUS, DEBUG_STATUS})
+
+    LINK_SYNC = ((SYNC_STATUS, 0, 1, 1),)
+
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address)
 
     def soft_reset(self):
         self.write_register_field(self.RESET, 0, 1, 1)
-        time.sleep(1.0)
-        assert not self.check_register_bit(self.RESET, 1), "reset in progress"
+        self.invalidate_shadow()  # the reset restores configuration registers as well
+        # the reset bit self-clears once the core is out of reset
+        assert self.wait_until([(self.RESET, 0, 2, 0)], timeout=1.0, label="JESD204B soft reset"), "reset in progress"
+
+    def read_status(self) -> "Jesd204Status":
+        block = self.read_register_block(self.VERSION, self.DEBUG_STATUS // 4 + 1)  # one snapshot of the whole register map
+        return Jesd204Status.decode(block)
 
     def show_info(self):
-        print("\nJESD204B status:")
-        print(f"\n\tself-clearing reset in progress: {is_bit_set(self._read_register(self.RESET), 0)}")
-        print(f"\tfixed reset set: {is_bit_set(self._read_register(self.RESET), 1)}")
-        print(f"\twatchdog enabled: {not is_bit_set(self._read_register(self.RESET), 16)}")
-        version = self._read_register(self.VERSION)
-        major = version >> 24
-        minor = (version >> 16) & 0xF
-        revision = (version >> 8) & 0xF
-        print(f"\n\tJESD204B IP version: {major}.{minor}.{revision}")
-        print(f"\tILA support enabled: {is_bit_set(self._read_register(self.ILA_SUPPORT), 0)}")
-        print(f"\tSYSREF Required on Re-Sync: {is_bit_set(self._read_register(self.SYSREF_HANDLING), 16)}")
-        print(f"\tSYSREF Always: {is_bit_set(self._read_register(self.SYSREF_HANDLING), 0)}")
-
-        print(f"\n\tscrambling enabled: {is_bit_set(self._read_register(self.SCRAMBLING), 0)}")
-        print(f"\toctets per frame(F): {get_bits(self._read_register(self.OCTETS_PER_FRAME), 0, 8) + 1}")
-        print(f"\tframes per multiframe(K): {get_bits(self._read_register(self.FRAMES_PER_MULTIFRAME), 0, 8) + 1}")
-        lane_in_use_value = get_bits(self._read_register(self.LANE_IN_USE), 0, 8)
-        lane_in_use = []
-        for lane_id in range(8):
-            if lane_in_use_value % 2 == 1:
-                lane_in_use.append(lane_id)
-            lane_in_use_value = lane_in_use_value >> 1
-        print(f"\tlane in use(L): {len(lane_in_use)}({lane_in_use})")
-        print(f"\tsubclass: {get_bits(self._read_register(self.SUBCLASS_MODE), 0, 2)}")
-
-        print(f"\n\tRX Buffer Delay: {get_bits(self._read_register(self.RX_BUFFER_DELAY), 0, 10)}")
-        print(f"\tA SYSREF event has been captured: {is_bit_set(self._read_register(self.SYNC_STATUS), 16)}")
-        print(f"\tLink Sync achieved: {is_bit_set(self._read_register(self.SYNC_STATUS), 0)}")
-
-        link_error_status = self._read_register(self.LINK_ERROR_STATUS)
-        link_debug_status = self._read_register(self.DEBUG_STATUS)
-        print(f"\tLane Alignment Error Detected Alarm: {is_bit_set(link_error_status, 31)}")
-        print(f"\tSYSREF LMFC Alarm: {is_bit_set(link_error_status, 30)}")
-        print(f"\tRX Buffer Overflow Alarm: {is_bit_set(link_error_status, 29)}")
-        for lane_id in lane_in_use:
-            error_status = get_bits(link_error_status, lane_id * 3, (lane_id + 1) * 3)
-            debug_status = get_bits(link_debug_status, lane_id * 4, (lane_id + 1) * 4)
-            print(f"\n\tlane {lane_id}: "
-                  f"\n\t\tUnexpected K-character(s) received: {is_bit_set(error_status, 2)}"
-                  f"\n\t\tDisparity Error(s) received: {is_bit_set(error_status, 1)}"
-                  f"\n\t\tNot in Table Error(s) received: {is_bit_set(error_status, 0)}"
-                  f"\n\t\tStart of Data was Detected: {is_bit_set(debug_status, 3)}"
-                  f"\n\t\tStart of ILA was Detected: {is_bit_set(debug_status, 2)}"
-                  f"\n\t\tLane has Code Group Sync: {is_bit_set(debug_status, 1)}"
-                  f"\n\t\tLane is currently receiving K28.5's (BC alignment characters): {is_bit_set(debug_status, 0)}")
-
-    def init_for_das(self):
-        self.write_register_field(self.RESET, 16, 1, 0)  # enable watchdog, reset register is self-clearing
-        self.write_register_field(self.ILA_SUPPORT, 0, 1, 1, strict=True)
-        self.write_register_field(self.SCRAMBLING, 0, 1, 1, strict=True)
-        self.write_register_field(self.LANE_IN_USE, 0, 8, 0xf, strict=True)
-        self.write_register_field(self.SUBCLASS_MODE, 0, 2, 1, strict=True)
-        # self.soft_reset()  # FIXME: this makes the ILA support value cleared
+        self.read_status().show_info()
+
+    def das_sequence(self) -> RegisterSequence:
+        return (RegisterSequence("JESD204B DAS")
+                .write_field(self.RESET, 16, 1, 0)  # enable watchdog, reset register is self-clearing
+                .write_field(self.ILA_SUPPORT, 0, 1, 1)
+                .write_field(self.SCRAMBLING, 0, 1, 1)
+                .write_field(self.LANE_IN_USE, 0, 8, 0xf)
+                .write_field(self.SUBCLASS_MODE, 0, 2, 1))
+        # soft reset not included  # FIXME: this makes the ILA support value cleared
+
+    def init_for_das(self, diff: bool = False):
+        """diff = True only writes the registers which differ, see RegisterSequence.run"""
+        report = self.das_sequence().run(self, diff)
+        assert report.ok, report.errors()
+
+    def init_done(self):
+        return self.check_register_bit(self.SYNC_STATUS, 0)  # link sync achieved
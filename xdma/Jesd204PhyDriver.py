@@ -6,12 +6,15 @@
 # @Software: PyCharm 
 # @Comment :
 
+from dataclasses import dataclass
+
 from xdma.XdmaDeviceFile import *
 
 
 class Jesd204Phy_Pll(Register32):
     address = 0x080
-    field_widths = [1, 1, 1, 1, 1]
+    fields = (("qpll1_unlock", 1), ("qpll0_unlock", 1), ("cpll_unlock", 1), ("rx_reset_in_progress", 1),
+              ("tx_reset_in_progress", 1))
 
     def __init__(self, qpll1_unlock=1, qpll0_unlock=1, cpll_unlock=1, rx_reset_in_progress=1, tx_reset_in_progress=1):
         self.qpll1_unlock = qpll1_unlock
@@ -21,38 +24,74 @@ class Jesd204Phy_Pll(Register32):
         self.tx_reset_in_progress = tx_reset_in_progress
 
 
+@dataclass
+class Jesd204PhyStatus:
+    qpll0_locked: bool
+    qpll1_locked: bool
+    cpll_locked: bool
+    rx_reset_in_progress: bool
+    tx_reset_in_progress: bool
+    rx_pll_type: str
+    rx_line_rate: int  # kHz
+    rx_refclk: int  # kHz
+
+    @classmethod
+    def decode(cls, block: np.ndarray):
+        """block: the registers from PLL_STATUS to RXPLL"""
+        def register(addr):
+            return int(block[(addr - Jesd204PhyDriver.PLL_STATUS) >> 2])
+
+        status_pll = Jesd204Phy_Pll()
+        status_pll.from_value(register(Jesd204PhyDriver.PLL_STATUS))
+        pll_type = 'unknown'
+        match get_bits(register(Jesd204PhyDriver.RXPLL), 0, 2):
+            case 0:
+                pll_type = 'CPLL'
+            case 2:
+                pll_type = 'QPLL1'
+            case 3:
+                pll_type = 'QPLL0'
+        return cls(status_pll.qpll0_unlock == 0, status_pll.qpll1_unlock == 0, status_pll.cpll_unlock == 0,
+                   status_pll.rx_reset_in_progress == 1, status_pll.tx_reset_in_progress == 1, pll_type,
+                   register(Jesd204PhyDriver.RXLINERATE), register(Jesd204PhyDriver.RXREFCLK))
+
+    def show_info(self):
+        print("\nJESD204C PHY IP status:")
+        print(f"\tqpll0 locked: {self.qpll0_locked}")
+        print(f"\tqpll1 locked: {self.qpll1_locked}")
+        print(f"\tcpll locked: {self.cpll_locked}")
+        print(f"\trx reset in progress: {self.rx_reset_in_progress}")
+        print(f"\ttx reset in progress: {self.tx_reset_in_progress}")
+        print(f"\tRX pll type: {self.rx_pll_type}")
+        print(f"\tRX line rate: {self.rx_line_rate / 1000_000} GHz")
+        print(f"\tRX refclk frequency: {self.rx_refclk / 1000} MHz")
+
+
 class Jesd204PhyDriver(XdmaDeviceFile):
     PLL_STATUS = 0x080
     RXLINERATE = 0x90
     RXREFCLK = 0x98
     RXPLL = 0x0A0
 
+    STABLE_REGISTERS = frozenset({RXLINERATE, RXPLL})
+    VOLATILE_REGISTERS = frozenset({PLL_STATUS, RXREFCLK})  # RXREFCLK is a frequency measurement
+
     def __init__(self, read_device_file_path, write_device_file_path, base_address):
         super().__init__(read_device_file_path, write_device_file_path, base_address)
 
-    def show_info(self):
-        print("\nJESD204C PHY IP status:")
-        status_pll = Jesd204Phy_Pll()
-        self.read_register32(status_pll)
+    def read_status(self) -> "Jesd204PhyStatus":
+        block = self.read_register_block(self.PLL_STATUS, (self.RXPLL - self.PLL_STATUS) // 4 + 1)
+        return Jesd204PhyStatus.decode(block)
 
-        # IP config
-        print(f"\tqpll0 locked: {status_pll.qpll0_unlock == 0}")
-        print(f"\tqpll1 locked: {status_pll.qpll1_unlock == 0}")
-        print(f"\tcpll locked: {status_pll.cpll_unlock == 0}")
-        print(f"\trx reset in progress: {status_pll.rx_reset_in_progress == 1}")
-        print(f"\ttx reset in progress: {status_pll.tx_reset_in_progress == 1}")
+    def rx_ready_conditions(self) -> list[tuple]:
+        """RX reset done and the PLL used by RX locked"""
+        pll_unlock_bit = {0: 2, 2: 0, 3: 1}.get(self.read_register_field(self.RXPLL, 0, 2), 2)
+        return [(self.PLL_STATUS, 3, 1, 0), (self.PLL_STATUS, pll_unlock_bit, 1, 0)]
 
-        rxpll = self.read_register_field(self.RXPLL, 0, 2)
-        pll_type = 'unknown'
-        match rxpll:
-            case 0:
-                pll_type = 'CPLL'
-            case 2:
-                pll_type = 'QPLL1'
-            case 3:
-                pll_type = 'QPLL0'
-        print(f"\tRX pll type: {pll_type}")
-        rx_linerate = self.read_register_field(self.RXLINERATE, 0, 32)
-        print(f"\tRX line rate: {rx_linerate / 1000_000} GHz")
-        rx_refclk = self.read_register_field(self.RXREFCLK, 0, 32)
-        print(f"\tRX refclk frequency: {rx_refclk / 1000} MHz")
+    def init_done(self):
+        status = self.read_status()
+        locked = {'CPLL': status.cpll_locked, 'QPLL0': status.qpll0_locked, 'QPLL1': status.qpll1_locked}
+        return locked.get(status.rx_pll_type, False) and not status.rx_reset_in_progress
+
+    def show_info(self):
+        self.read_status().show_info()
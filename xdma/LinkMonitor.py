@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 17:40
+# @Author  : DAS
+# @Site    :
+# @File    : LinkMonitor.py
+# @Software: PyCharm
+# @Comment : background JESD204(C) link health sampling into a fixed-size ring, with callbacks on flag transitions
+
+from dataclasses import dataclass
+from typing import Callable
+
+from xdma.Jesd204CDriver import Jesd204CDriver, Jesd204_Config
+from xdma.Jesd204Driver import Jesd204Driver
+from xdma.XdmaDeviceFile import *
+
+MAX_LANES = 8
+# bits of a lane byte, the 3 error bits then the 4 debug bits of Jesd204LaneStatus
+LANE_FLAGS = ('not_in_table_error', 'disparity_error', 'unexpected_k_character',
+              'receiving_k28_5', 'code_group_sync', 'start_of_ila', 'start_of_data')
+# bits of the link byte
+LINK_FLAGS = ('sync', 'sysref_captured', 'sysref_error', 'buffer_overflow', 'code_group_sync', 'rx_started',
+              'alignment_error')
+SAMPLE_DTYPE = np.dtype([('timestamp_ns', np.int64), ('link', np.uint8), ('lanes', np.uint8, MAX_LANES)])  # 17 bytes
+DEFAULT_RATE = 100.0  # samples per second
+DEFAULT_CAPACITY = 4096
+EDGES = ('rise', 'fall', 'both')
+
+
+@dataclass
+class LinkLayout:
+    """where a core keeps its link status, as indexes into one block read of count registers from first"""
+    first: int
+    count: int
+    error: int  # 3 error bits per lane
+    debug: int  # 4 debug bits per lane
+    link_bits: tuple[tuple[str, int, int], ...]  # (link flag, register index, bit)
+
+
+JESD204C_LAYOUT = LinkLayout(Jesd204CDriver.STAT_RX_ERR, 3, 0, 1, (
+    ('sync', 2, 12), ('sysref_captured', 2, 1), ('sysref_error', 2, 2), ('buffer_overflow', 2, 10),
+    ('code_group_sync', 2, 13), ('rx_started', 2, 14), ('alignment_error', 2, 15)))
+
+# JESD204B has no link level code group sync and RX started, the lane flags carry them
+_SYNC_INDEX = (Jesd204Driver.SYNC_STATUS - Jesd204Driver.LINK_ERROR_STATUS) >> 2
+JESD204B_LAYOUT = LinkLayout(Jesd204Driver.LINK_ERROR_STATUS,
+                             ((Jesd204Driver.DEBUG_STATUS - Jesd204Driver.LINK_ERROR_STATUS) >> 2) + 1, 0,
+                             (Jesd204Driver.DEBUG_STATUS - Jesd204Driver.LINK_ERROR_STATUS) >> 2, (
+    ('sync', _SYNC_INDEX, 0), ('sysref_captured', _SYNC_INDEX, 16), ('sysref_error', 0, 30),  # SYSREF LMFC alarm
+    ('buffer_overflow', 0, 29), ('alignment_error', 0, 31)))
+
+
+@dataclass
+class LinkEvent:
+    flag: str
+    lane: int  # None for a link flag
+    value: bool  # the new state
+    timestamp_ns: int
+    sample: int  # index of the sample since start
+
+    def __str__(self):
+        where = "link" if self.lane is None else f"lane {self.lane}"
+        return f"{where} {self.flag} {'set' if self.value else 'cleared'} @ sample {self.sample}"
+
+
+class LinkMonitor:
+    """
+    Samples the link status of a Jesd204Driver or Jesd204CDriver from a background thread, every sample is a single
+    register block read, decoded into a link byte and a byte per lane (LINK_FLAGS, LANE_FLAGS) and kept in a ring
+    of the last capacity samples.
+
+    Callbacks are registered per flag and fire from the monitor thread on transitions, the first sample sets the
+    baseline. Lane flags only fire for lanes in use.
+
+        monitor = LinkMonitor(jesd204c, rate=200)
+        monitor.on('sync', lambda event: print(event), edge='fall')  # loss of sync
+        monitor.on('disparity_error', handler)
+        with monitor:
+            ...
+        monitor.lane_flag('disparity_error')  # (samples, lanes) bool history
+
+    Unchanged raw values skip the decoding, a sample costs the block read and a few comparisons, see overhead().
+    """
+
+    def __init__(self, driver: Jesd204Driver | Jesd204CDriver, rate: float = DEFAULT_RATE,
+                 capacity: int = DEFAULT_CAPACITY, lanes: int = None):
+        assert rate > 0 and capacity > 0
+        self.driver = driver
+        if isinstance(driver, Jesd204CDriver):
+            self.layout = JESD204C_LAYOUT
+            lanes = lanes or driver.read_register_field(Jesd204_Config.address, 0, 4)
+            self.lane_mask = (1 << lanes) - 1
+        else:
+            self.layout = JESD204B_LAYOUT
+            self.lane_mask = driver.read_register_field(driver.LANE_IN_USE, 0, 8) if lanes is None else (1 << lanes) - 1
+        self.lanes = frozenset(lane for lane in range(MAX_LANES) if self.lane_mask >> lane & 1)
+        self.link_bits = tuple((LINK_FLAGS.index(flag), index, position) for flag, index, position in self.layout.link_bits)
+        self.interval = 1.0 / rate
+        self.ring = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0  # samples taken, the latest is at (count - 1) % capacity
+        self.poll_ns = 0  # total time spent sampling, see overhead
+        self.callbacks: dict[str, list[tuple[Callable, str]]] = {}
+        self.error = None  # last exception raised by a callback, the monitor goes on
+        self.previous_raw = None
+        self.previous = (0, (0,) * MAX_LANES)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def on(self, flag: str, callback: Callable, edge: str = 'rise'):
+        """callback(LinkEvent) on the edge ('rise', 'fall' or 'both') of a LINK_FLAGS or LANE_FLAGS flag"""
+        assert flag in LINK_FLAGS or flag in LANE_FLAGS, f"unknown flag {flag}"
+        assert edge in EDGES, f"bad edge {edge}"
+        self.callbacks.setdefault(flag, []).append((callback, edge))
+        return self
+
+    ####################
+    # Sampling
+    ####################
+
+    def _decode(self, raw: list[int]):
+        link = 0
+        for bit, index, position in self.link_bits:
+            link |= ((raw[index] >> position) & 1) << bit
+        error, debug = raw[self.layout.error], raw[self.layout.debug]
+        lanes = tuple(((error >> (lane * 3)) & 0x7) | (((debug >> (lane * 4)) & 0xF) << 3) if lane in self.lanes else 0
+                      for lane in range(MAX_LANES))
+        return link, lanes
+
+    def sample(self):
+        """take one sample now, returns (link byte, lane bytes)"""
+        start = time.perf_counter_ns()
+        raw = self.driver.read_register_block(self.layout.first, self.layout.count).tolist()
+        if raw != self.previous_raw:
+            link, lanes = self._decode(raw)
+        else:
+            link, lanes = self.previous
+        record = self.ring[self.count % len(self.ring)]
+        record['timestamp_ns'] = start
+        record['link'] = link
+        record['lanes'] = lanes
+        if self.count and self.callbacks and (link, lanes) != self.previous:
+            self._fire(self.previous, (link, lanes), start)
+        self.previous_raw = raw
+        self.previous = (link, lanes)
+        self.count += 1
+        self.poll_ns += time.perf_counter_ns() - start
+        return link, lanes
+
+    def _fire(self, previous, current, timestamp_ns: int):
+        events = []
+        changed = previous[0] ^ current[0]
+        for bit, flag in enumerate(LINK_FLAGS):
+            if changed >> bit & 1:
+                events.append(LinkEvent(flag, None, bool(current[0] >> bit & 1), timestamp_ns, self.count))
+        for lane, (before, after) in enumerate(zip(previous[1], current[1])):
+            changed = before ^ after
+            for bit, flag in enumerate(LANE_FLAGS):
+                if changed >> bit & 1:
+                    events.append(LinkEvent(flag, lane, bool(after >> bit & 1), timestamp_ns, self.count))
+        for event in events:
+            for callback, edge in self.callbacks.get(event.flag, ()):
+                if edge == 'both' or (edge == 'rise') == event.value:
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        self.error = e
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.sample()
+            deadline += self.interval
+            delay = deadline - time.perf_counter()
+            if delay < 0:
+                deadline -= delay  # fell behind, no burst of samples to catch up
+            self.stop_event.wait(max(delay, 0.0))
+
+    def start(self):
+        assert self.thread is None, "monitor already started"
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name=f"link monitor {hex(self.driver.base_address)}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    ####################
+    # History
+    ####################
+
+    def history(self) -> np.ndarray:
+        """the samples kept in the ring, oldest first"""
+        capacity = len(self.ring)
+        if self.count <= capacity:
+            return self.ring[:self.count].copy()
+        head = self.count % capacity
+        return np.concatenate((self.ring[head:], self.ring[:head]))
+
+    def link_flag(self, flag: str) -> np.ndarray:
+        """(samples,) bool history of a LINK_FLAGS flag"""
+        return (self.history()['link'] >> LINK_FLAGS.index(flag)) & 1 == 1
+
+    def lane_flag(self, flag: str) -> np.ndarray:
+        """(samples, MAX_LANES) bool history of a LANE_FLAGS flag"""
+        return (self.history()['lanes'] >> LANE_FLAGS.index(flag)) & 1 == 1
+
+    def overhead(self) -> float:
+        """mean seconds per sample"""
+        return self.poll_ns / max(self.count, 1) / 1e9
+
+    def show_info(self):
+        link, lanes = self.previous
+        print(f"\nlink monitor: {self.count} samples, {self.overhead() * 1e6:.1f} us per sample, "
+              f"{self.overhead() / self.interval * 100:.3f} % of the time")
+        print(f"\tlink: {', '.join(flag for bit, flag in enumerate(LINK_FLAGS) if link >> bit & 1) or '-'}")
+        for lane in range(MAX_LANES):
+            if lane in self.lanes:
+                print(f"\tlane {lane}: {', '.join(flag for bit, flag in enumerate(LANE_FLAGS) if lanes[lane] >> bit & 1) or '-'}")
+        if self.error is not None:
+            print(f"\tlast callback error: {self.error!r}")
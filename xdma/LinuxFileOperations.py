@@ -1,11 +1,23 @@
+import ctypes
+import errno
 import os
+import re
+
 import numpy as np
 
+from xdma.StagingBuffer import contiguous_view
+
 
 def get_device_paths():
     xdma_device_files = [f"/dev/{device}" for device in os.listdir("/dev") if device.startswith("xdma")]
     xdma_root_device_files = list(set([device.split("_")[0] for device in xdma_device_files]))
-    return xdma_root_device_files
+    # in card number order, /dev/xdma10 after /dev/xdma9, so that an index into the list always means the same card
+    return sorted(xdma_root_device_files, key=_card_number)
+
+
+def _card_number(device_path):
+    number = re.search(r'\d+$', device_path)
+    return (int(number.group()), device_path) if number else (-1, device_path)
 
 
 ####################
@@ -18,6 +30,16 @@ GENERIC_RW = os.O_RDWR
 
 INVALID_HANDLE_VALUE = -1  # catch OSError and return this value for consistency
 FILE_BEGIN = os.SEEK_SET
+IOV_MAX = os.sysconf('SC_IOV_MAX')  # most buffers accepted by one readv/writev
+
+# read(2)/pread(2) into the array's memory, os.readv/os.preadv would reach the xdma driver's AIO path (.read_iter),
+# see readv_from_handle
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.read.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t)
+_libc.read.restype = ctypes.c_ssize_t
+_pread = getattr(_libc, 'pread64', None) or _libc.pread  # 64 bit offsets on 32 bit builds as well
+_pread.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int64)
+_pread.restype = ctypes.c_ssize_t
 
 
 def get_handle(device_path, access):
@@ -39,23 +61,106 @@ def call_with_func(winfunc, *args):
     return result
 
 
-def read_from_handle(handle, buf: np.ndarray, nbytes: int) -> int:
+def byte_view(buf: np.ndarray) -> memoryview:
+    """flat uint8 view of a C-contiguous array, valid for any dtype"""
+    return memoryview(buf.reshape(-1).view(np.uint8))
+
+
+def _libc_call(function, *args) -> int:
+    """call a read(2) style libc function, retried on EINTR like os.read, failures raised as OSError"""
+    while True:
+        result = function(*args)
+        if result >= 0:
+            return result
+        error = ctypes.get_errno()
+        if error != errno.EINTR:
+            raise OSError(error, os.strerror(error))
+
+
+def read_from_handle(handle, buf: np.ndarray, nbytes: int, verbose: bool = True) -> int:
     """将文件中的数据读入NumPy数组"""
-    data = os.read(handle, nbytes)
-    nread = len(data)
-    buf[:] = np.frombuffer(data, dtype=buf.dtype).reshape(buf.shape)
-    if nread != nbytes:
+    if buf.flags.c_contiguous:
+        # read(2) fills the array in place, no intermediate bytes object
+        nread = _libc_call(_libc.read, handle, buf.ctypes.data, min(nbytes, buf.nbytes))
+    else:
+        data = os.read(handle, nbytes)
+        nread = len(data)
+        buf[:] = np.frombuffer(data, dtype=buf.dtype).reshape(buf.shape)
+    if verbose and nread != nbytes:
         print(f"bad read {nread} / {nbytes}")
     return nread
 
 
-def write_to_handle(handle, buf: np.ndarray, nbytes: int) -> int:
+def write_to_handle(handle, buf: np.ndarray, nbytes: int, verbose: bool = True) -> int:
     """将NumPy数组中的数据写入文件"""
-    nwritten = os.write(handle, buf.flatten().tobytes())
-    if nwritten != nbytes:
+    nwritten = os.write(handle, byte_view(contiguous_view(buf))[:nbytes])
+    if verbose and nwritten != nbytes:
         print(f"bad write {nwritten} / {nbytes}")
     return nwritten
 
 
+def pread_from_handle(handle, buf: np.ndarray, nbytes: int, offset: int, verbose: bool = True) -> int:
+    """从offset处读入NumPy数组,不使用也不改变文件偏移,可被多个线程同时用于同一handle"""
+    if buf.flags.c_contiguous:
+        nread = _libc_call(_pread, handle, buf.ctypes.data, min(nbytes, buf.nbytes), offset)
+    else:
+        data = os.pread(handle, nbytes, offset)
+        nread = len(data)
+        buf[:] = np.frombuffer(data, dtype=buf.dtype).reshape(buf.shape)
+    if verbose and nread != nbytes:
+        print(f"bad read {nread} / {nbytes} @ {hex(offset)}")
+    return nread
+
+
+def pwrite_to_handle(handle, buf: np.ndarray, nbytes: int, offset: int, verbose: bool = True) -> int:
+    """将NumPy数组写入offset处,不使用也不改变文件偏移"""
+    nwritten = os.pwrite(handle, byte_view(contiguous_view(buf))[:nbytes], offset)
+    if verbose and nwritten != nbytes:
+        print(f"bad write {nwritten} / {nbytes} @ {hex(offset)}")
+    return nwritten
+
+
+def readv_from_handle(handle, bufs: list[np.ndarray], offset: int = -1) -> int:
+    """依次读满多个NumPy数组,每IOV_MAX个数组一次readv(offset >= 0时为preadv),返回读取的总字节数"""
+    # readv/preadv go through the xdma driver's AIO path (.read_iter), not .read: depending on the driver version the
+    # file position and offset are ignored or the call fails with EIOCBQUEUED, check the driver before relying on it
+    # non-contiguous arrays are read into a packed copy and scattered back afterwards
+    targets = [buf if buf.flags.c_contiguous else np.empty_like(buf, order='C') for buf in bufs]
+    total = 0
+    for group_start in range(0, len(targets), IOV_MAX):
+        views = [byte_view(target) for target in targets[group_start:group_start + IOV_MAX]]
+        expected = sum(view.nbytes for view in views)
+        if offset >= 0:
+            nread = os.preadv(handle, views, offset + total)
+        else:
+            nread = os.readv(handle, views)
+        total += nread
+        if nread != expected:
+            break
+    for buf, target in zip(bufs, targets):
+        if target is not buf:
+            buf[...] = target
+    return total
+
+
+def writev_to_handle(handle, bufs: list[np.ndarray], offset: int = -1) -> int:
+    """依次写出多个NumPy数组,每IOV_MAX个数组一次writev(offset >= 0时为pwritev),返回写入的总字节数"""
+    # writev/pwritev go through the xdma driver's AIO path (.write_iter), the caveats of readv_from_handle apply
+    # the staging buffer of contiguous_view is shared by the thread, so each non-contiguous array gets its own copy here
+    views = [byte_view(np.ascontiguousarray(buf)) for buf in bufs]
+    total = 0
+    for group_start in range(0, len(views), IOV_MAX):
+        group = views[group_start:group_start + IOV_MAX]
+        expected = sum(view.nbytes for view in group)
+        if offset >= 0:
+            nwritten = os.pwritev(handle, group, offset + total)
+        else:
+            nwritten = os.writev(handle, group)
+        total += nwritten
+        if nwritten != expected:
+            break
+    return total
+
+
 def close_handle(handle):
     os.close(handle)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 9:30
+# @Author  : DAS
+# @Site    :
+# @File    : MmapWindowRegistry.py
+# @Software: PyCharm
+# @Comment : long-lived mmap windows shared by every register access of the process
+
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+
+DEFAULT_WINDOW_SIZE = 0x1_0000  # 64KB, the size of the XDMA control BAR, so an aligned window never crosses a BAR end
+DEFAULT_MAX_WINDOWS = 64
+
+
+class RegisterWindow:
+    """A mapping of [base, base + size) of a device file, kept until it is evicted"""
+
+    def __init__(self, path: str, base: int, size: int):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE, offset=base)
+        finally:
+            os.close(fd)  # the mapping stays valid after the descriptor is closed
+        # native 32-bit items, indexing is a single load/store of the register
+        self.words = memoryview(self.mm).cast('I')
+        self.path = path
+        self.base = base
+        self.size = size
+        self.last_use = 0
+
+    def read(self, offset: int, access_width='w') -> int:
+        if access_width == 'b':
+            return self.mm[offset]
+        if offset & 0x3 == 0:
+            return self.words[offset >> 2]
+        return int.from_bytes(self.mm[offset:offset + 4], byteorder='little', signed=False)
+
+    def read_block(self, offset: int, count: int, access_width='w') -> list[int]:
+        # one load per register, a plain memory copy may issue wider accesses than the AXI LITE slaves support
+        if access_width == 'b':
+            return [self.mm[offset + i] for i in range(count)]
+        if offset & 0x3 == 0:
+            return self.words[offset >> 2:(offset >> 2) + count].tolist()
+        return [self.read(offset + 4 * i) for i in range(count)]
+
+    def write(self, offset: int, value: int, access_width='w'):
+        if access_width == 'b':
+            self.mm[offset] = int(value)
+        elif offset & 0x3 == 0:
+            self.words[offset >> 2] = int(value)
+        else:
+            self.mm[offset:offset + 4] = int(value).to_bytes(4, byteorder='little', signed=False)
+
+    def close(self):
+        self.words.release()
+        self.mm.close()
+
+
+class MmapWindowRegistry:
+    """
+    Process-wide registry of RegisterWindow, keyed by (device path, window base)
+
+    All XdmaDeviceFile instances and their remap() results go through the same registry, so drivers sharing a BAR
+    through different base addresses share the mappings as well. When more than max_windows are mapped, the least
+    recently used window is unmapped.
+    """
+
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, max_windows: int = DEFAULT_MAX_WINDOWS):
+        assert window_size % mmap.ALLOCATIONGRANULARITY == 0, "window size must be a multiple of the page size"
+        assert max_windows > 0
+        self.window_size = window_size
+        self.max_windows = max_windows
+        self.windows = {}
+        self.use_count = 0  # logical clock for LRU, cheaper than reordering on every access
+        self.path_window_size = {}  # paths that could not be mapped by window_size fall back to a page
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_window(self, path: str, addr: int) -> RegisterWindow:
+        # caller holds self.lock
+        size = self.path_window_size.get(path, self.window_size)
+        key = (path, addr & ~(size - 1))
+        self.use_count += 1
+        window = self.windows.get(key)
+        if window is not None:
+            window.last_use = self.use_count
+            self.hits += 1
+            return window
+
+        self.misses += 1
+        try:
+            window = RegisterWindow(path, key[1], size)
+        except (OSError, ValueError):
+            # BAR (or stand-in file) smaller than the window, map a single page as the original access did
+            if size == mmap.ALLOCATIONGRANULARITY:
+                raise
+            self.path_window_size[path] = mmap.ALLOCATIONGRANULARITY
+            return self._get_window(path, addr)
+        window.last_use = self.use_count
+        self.windows[key] = window
+        if len(self.windows) > self.max_windows:
+            lru_key = min(self.windows, key=lambda k: self.windows[k].last_use)
+            self.windows.pop(lru_key).close()
+            self.evictions += 1
+        return window
+
+    def _read(self, path: str, addr: int, access_width='w') -> int:
+        # caller holds self.lock
+        window = self._get_window(path, addr)
+        offset = addr - window.base
+        if access_width == 'b' or offset + 4 <= window.size:
+            return window.read(offset, access_width)
+        # an unaligned word across the end of the window, its bytes come from both windows
+        data = window.mm[offset:]
+        following = self._get_window(path, window.base + window.size)
+        return int.from_bytes(data + following.mm[:4 - len(data)], byteorder='little', signed=False)
+
+    def _write(self, path: str, addr: int, value: int, access_width='w'):
+        # caller holds self.lock
+        window = self._get_window(path, addr)
+        offset = addr - window.base
+        if access_width == 'b' or offset + 4 <= window.size:
+            window.write(offset, value, access_width)
+            return
+        data = int(value).to_bytes(4, byteorder='little', signed=False)
+        head = window.size - offset
+        window.mm[offset:] = data[:head]
+        self._get_window(path, window.base + window.size).mm[:4 - head] = data[head:]
+
+    def read(self, path: str, addr: int, access_width='w') -> int:
+        with self.lock:
+            return self._read(path, addr, access_width)
+
+    def read_block(self, path: str, addr: int, count: int, access_width='w') -> list[int]:
+        """count consecutive registers from addr, one lock and one window lookup per window crossed"""
+        step = 1 if access_width == 'b' else 4
+        values = []
+        with self.lock:
+            while len(values) < count:
+                window = self._get_window(path, addr)
+                offset = addr - window.base
+                n = min(count - len(values), (window.size - offset) // step)
+                if n == 0:  # an unaligned word across the end of the window
+                    values.append(self._read(path, addr, access_width))
+                    n = 1
+                else:
+                    values += window.read_block(offset, n, access_width)
+                addr += n * step
+        return values
+
+    def write(self, path: str, addr: int, value: int, access_width='w'):
+        with self.lock:
+            self._write(path, addr, value, access_width)
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the registry across a run of accesses, yields (read(path, addr, access_width), write(path, addr, value,
+        access_width)) working like the read and write methods
+
+        No per-access locking, and no window is evicted by another thread until the run is over. Keep the run short.
+        """
+        with self.lock:
+            yield self._read, self._write
+
+    def invalidate(self, path: str = None):
+        """Unmap all windows of path, or every window when path is None"""
+        with self.lock:
+            for key in [key for key in self.windows if path is None or key[0] == path]:
+                self.windows.pop(key).close()
+            if path is None:
+                self.path_window_size.clear()
+            else:
+                self.path_window_size.pop(path, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"windows": len(self.windows), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+register_windows = MmapWindowRegistry()
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # tmpfs file standing in for a BAR of two windows, unaligned words across the window boundary
+    with tempfile.NamedTemporaryFile(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as stand_in_file:
+        stand_in_file.truncate(2 * DEFAULT_WINDOW_SIZE)
+        stand_in_file.flush()
+        boundary = DEFAULT_WINDOW_SIZE
+        for addr in range(boundary - 3, boundary):
+            register_windows.write(stand_in_file.name, addr, 0x12345678)
+            assert register_windows.read(stand_in_file.name, addr) == 0x12345678
+        register_windows.write(stand_in_file.name, boundary - 6, 0xAABBCCDD)
+        register_windows.write(stand_in_file.name, boundary - 2, 0x12345678)
+        register_windows.write(stand_in_file.name, boundary + 2, 0x99887766)
+        assert register_windows.read_block(stand_in_file.name, boundary - 6, 3) == [0xAABBCCDD, 0x12345678, 0x99887766]
+        with register_windows.locked() as (read, write):
+            write(stand_in_file.name, boundary - 2, 0x0BADF00D)
+            assert read(stand_in_file.name, boundary - 2) == 0x0BADF00D
+        register_windows.invalidate(stand_in_file.name)
+        print("unaligned words across windows: passed")
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 20:15
+# @Author  : DAS
+# @Site    :
+# @File    : MultiCardCapture.py
+# @Software: PyCharm
+# @Comment : concurrent C2H capture from every enumerated XDMA card
+
+import queue
+
+from xdma.StreamCapture import *
+
+
+class CardBlock:
+    """A captured block tagged with the card it came from, release() hands the slot back to that card's ring"""
+
+    def __init__(self, card_id: int, slot: CaptureSlot):
+        self.card_id = card_id
+        self.slot = slot
+        self.data = slot.data
+        self.nbytes = slot.nbytes
+        self.sequence = slot.sequence
+        self.timestamp_ns = slot.timestamp_ns  # monotonic, comparable across cards
+
+    def release(self):
+        self.slot.release()
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class MultiCardCapture:
+    """
+    One StreamCapture per card, each with its own reader thread and ring, so the host capture rate scales with the
+    number of cards. Blocks of all cards are delivered through a single iterator in arrival order.
+    """
+
+    def __init__(self, devices: list[XdmaDeviceFile] = None, channel: int = 0, block_shape=1 << 20, dtype=np.uint8,
+                 slot_count: int = 8, overrun: str = 'block'):
+        """
+        devices: c2h device files, one per card, by default c2h_<channel> of every card found by get_device_paths()
+        """
+        if devices is None:
+            devices = [XdmaDeviceFile(read_device_file_path=f"{path}{FILE_SEPERATOR}c2h_{channel}")
+                       for path in get_device_paths()]  # card number order on Linux, enumeration order on Windows
+        assert len(devices) > 0, "no XDMA card found"
+        self.captures = [StreamCapture(device, block_shape, dtype, slot_count, overrun) for device in devices]
+        self.blocks = queue.Queue()
+        self.forwarders = []
+        self.start_time = 0.0
+        self.stop_time = None
+
+    @property
+    def card_count(self):
+        return len(self.captures)
+
+    def _forward(self, card_id: int):
+        try:
+            for slot in self.captures[card_id]:
+                self.blocks.put(CardBlock(card_id, slot))
+        finally:
+            self.blocks.put(card_id)  # end of this card
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        for card_id, capture in enumerate(self.captures):
+            capture.start()
+            forwarder = threading.Thread(target=self._forward, args=(card_id,), name=f"card {card_id} forwarder", daemon=True)
+            forwarder.start()
+            self.forwarders.append(forwarder)
+        return self
+
+    def stop(self):
+        for capture in self.captures:
+            capture.stop_event.set()
+        for capture in self.captures:
+            capture.stop()
+        self.stop_time = time.perf_counter()
+
+    def __iter__(self):
+        running = self.card_count
+        while running > 0:
+            item = self.blocks.get()
+            if isinstance(item, CardBlock):
+                yield item
+            else:
+                running -= 1
+        errors = [capture.error for capture in self.captures if capture.error is not None]
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def throughput(self):
+        """MB/s per card and aggregated over all cards"""
+        seconds = (self.stop_time or time.perf_counter()) - self.start_time
+        per_card = [capture.stats.bytes / (1 << 20) / seconds if seconds > 0 else 0.0 for capture in self.captures]
+        return per_card, sum(per_card)
+
+    def show_info(self):
+        per_card, aggregate = self.throughput()
+        for card_id, capture in enumerate(self.captures):
+            print(f"\ncard {card_id} ({capture.device.read_path}): {per_card[card_id]:.1f} MB/s")
+            capture.stats.show_info()
+        print(f"\naggregate: {aggregate:.1f} MB/s over {self.card_count} cards")
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # regular files standing in for the c2h streams of three cards
+    stand_in_files = [tempfile.NamedTemporaryFile() for _ in range(3)]
+    for stand_in_file in stand_in_files:
+        stand_in_file.write(np.random.randint(0, 256, size=64 << 20, dtype=np.uint8).tobytes())
+        stand_in_file.flush()
+    cards = [XdmaDeviceFile(read_device_file_path=stand_in_file.name) for stand_in_file in stand_in_files]
+    with MultiCardCapture(cards, block_shape=1 << 20) as group:
+        for block in group:
+            with block:
+                block.data.sum(dtype=np.uint64)
+    group.show_info()
+    for stand_in_file in stand_in_files:
+        stand_in_file.close()
@@ -3,22 +3,63 @@
 # @Author  : Administrator
 # @Site    : ${SITE}
 # @File    : Register32.py
-# @Software: PyCharm 
-# @Comment : 
-class Register32:
+# @Software: PyCharm
+# @Comment :
+import numpy as np
+
+
+class Register32Meta(type):
+    """
+    Compiles the fields of a register class, ((name, width), ...) from the LSB up, into shifts and masks once
+
+    Field values are stored in __slots__, field_widths is derived for code still reading it.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get('fields')
+        if fields is not None:
+            codec = []
+            shift = 0
+            for field_name, width in fields:
+                codec.append((field_name, shift, (1 << width) - 1))
+                shift += width
+            assert shift <= 32, f"{name}: fields take {shift} bits"
+            namespace['__slots__'] = tuple(field_name for field_name, _ in fields)
+            namespace['field_widths'] = [width for _, width in fields]
+            namespace['codec'] = tuple(codec)
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class Register32(metaclass=Register32Meta):
+    __slots__ = ()
     address: int
+    fields: tuple[tuple[str, int], ...]
     field_widths: list[int]
+    codec: tuple[tuple[str, int, int], ...]  # (name, shift, mask), compiled from fields
 
     def to_value(self):
         value = 0
-        shift = 0
-        for (field_name, width) in zip(self.__dict__.keys(), self.field_widths):
-            value += (getattr(self, field_name) << shift)
-            shift += width
+        for field_name, shift, mask in self.codec:
+            value |= (int(getattr(self, field_name)) & mask) << shift
         return value
 
     def from_value(self, value):
-        for field_name, width in zip(self.__dict__.keys(), self.field_widths):
-            field_value = value % (1 << width)
-            setattr(self, field_name, field_value)
-            value >>= width
+        value = int(value)
+        for field_name, shift, mask in self.codec:
+            setattr(self, field_name, (value >> shift) & mask)
+
+    @classmethod
+    def decode_array(cls, raw: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Decode sampled raw values, returns an array per field in the smallest unsigned type holding it
+        """
+        raw = np.asarray(raw, dtype=np.uint32)
+        decoded = {}
+        for field_name, shift, mask in cls.codec:
+            dtype = np.uint8 if mask <= 0xFF else np.uint16 if mask <= 0xFFFF else np.uint32
+            decoded[field_name] = ((raw >> np.uint32(shift)) & np.uint32(mask)).astype(dtype)
+        return decoded
+
+    def __repr__(self):
+        values = ", ".join(f"{field_name}={getattr(self, field_name)}" for field_name, _, _ in self.codec)
+        return f"{type(self).__name__}({values})"
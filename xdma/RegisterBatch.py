@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 14:00
+# @Author  : DAS
+# @Site    :
+# @File    : RegisterBatch.py
+# @Software: PyCharm
+# @Comment : batched AXI LITE register transactions
+
+import time
+from dataclasses import dataclass, field
+
+from xdma.MmapWindowRegistry import register_windows
+
+WIDTH_MASKS = {'w': 0xFFFF_FFFF, 'b': 0xFF}
+VERIFY_POLICIES = ('none', 'each', 'sampled', 'end')
+DEFAULT_SAMPLE_INTERVAL = 8
+
+
+@dataclass
+class RegisterMismatch:
+    addr: int  # relative to the base address of the device
+    expected: int
+    actual: int
+
+    def __str__(self):
+        return f"write failed @ {hex(self.addr)}: expected = {hex(self.expected)}, actual = {hex(self.actual)}"
+
+
+@dataclass
+class BatchReport:
+    writes: int = 0
+    reads: int = 0  # read-modify-writes and verification
+    verified: int = 0
+    mismatches: list[RegisterMismatch] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+    def extend(self, other: "BatchReport"):
+        self.writes += other.writes
+        self.reads += other.reads
+        self.verified += other.verified
+        self.mismatches += other.mismatches
+        self.seconds += other.seconds
+        return self
+
+    def show_info(self):
+        print(f"\t{self.writes} writes, {self.reads} reads, {self.verified} verified in {self.seconds * 1000:.3f} ms")
+        for mismatch in self.mismatches:
+            print(f"\t{mismatch}")
+
+
+@dataclass
+class RegisterOperation:
+    addr: int
+    mask: int  # bits written, the others are kept by a read-modify-write
+    value: int
+    access_width: str = 'w'
+    verify: bool = True
+
+
+class RegisterBatch:
+    """
+    Collects register writes and field updates of a device, applies them in order with the register windows held once
+
+    Consecutive updates of disjoint fields of the same register are merged into a single read-modify-write, updates
+    covering the whole register need no read at all, nor do stable registers held by the device's shadow cache. Writes
+    are never reordered, and repeated writes of the same bits (pulses, write sequences) are all issued.
+
+    verify selects the readback of writes made with verify = True:
+        'none': no readback
+        'each': read back right after every write
+        'sampled': read back right after every sample_interval-th write, starting with the first
+        'end': a single readback of every verified register after the last write, the final value is compared
+
+        with device.batch() as batch:
+            batch.write_field(0x00, 0, 1, 1)
+            batch.write_field(0x00, 4, 1, 1)  # merged with the previous update
+            batch.write(0x10, 0x1234)
+
+    Leaving the with block applies the batch and raises AssertionError on mismatch, apply() returns a BatchReport instead.
+    """
+
+    def __init__(self, device, access_width='w', verify: str = 'end', sample_interval: int = DEFAULT_SAMPLE_INTERVAL):
+        assert verify in VERIFY_POLICIES, f"bad verify policy {verify}"
+        assert sample_interval > 0
+        self.device = device
+        self.access_width = access_width  # default of write and write_field
+        self.verify = verify
+        self.sample_interval = sample_interval
+        self.operations: list[RegisterOperation] = []
+
+    def _add(self, addr: int, mask: int, value: int, access_width: str, verify: bool):
+        value &= mask
+        last = self.operations[-1] if self.operations else None
+        if last is not None and last.addr == addr and last.access_width == access_width and not last.mask & mask:
+            last.value = (last.value & ~mask) | value
+            last.mask |= mask
+            last.verify = last.verify and verify  # an update not verified is a register which does not read back
+        else:
+            self.operations.append(RegisterOperation(addr, mask, value, access_width, verify))
+        return self
+
+    def write(self, addr: int, value: int, access_width=None, verify: bool = True):
+        access_width = access_width or self.access_width
+        return self._add(addr, WIDTH_MASKS[access_width], int(value), access_width, verify)
+
+    def write_field(self, addr: int, start: int, length: int, value: int, verify: bool = True, access_width=None):
+        access_width = access_width or self.access_width
+        mask = ((1 << length) - 1) << start
+        return self._add(addr, mask & WIDTH_MASKS[access_width], int(value) << start, access_width, verify)
+
+    def write_masked(self, addr: int, value: int, mask: int, access_width=None, verify: bool = True):
+        """write the bits of value selected by mask, keeping the others"""
+        access_width = access_width or self.access_width
+        return self._add(addr, mask & WIDTH_MASKS[access_width], int(value), access_width, verify)
+
+    def write_register32(self, reg, verify: bool = True):
+        return self.write(reg.address, reg.to_value(), verify=verify)
+
+    def _absolute(self, addr: int) -> int:
+        absolute = addr + self.device.base_address
+        if absolute >= self.device.max_address:
+            raise IndexError(f'target address {hex(absolute)} out of range')
+        return absolute
+
+    def _read(self, read, addr: int, access_width: str) -> int:
+        value = read(self.device.read_path, self._absolute(addr), access_width)
+        self.device._shadow_update(addr, value)
+        return value
+
+    def apply(self) -> BatchReport:
+        device = self.device
+        report = BatchReport()
+        start = time.perf_counter()
+        expected = {}  # (addr, access_width) -> value after the last write, for verify = 'end'
+        verifiable = 0
+        with register_windows.locked() as (read, write):
+            for operation in self.operations:
+                addr = self._absolute(operation.addr)
+                value = operation.value
+                if operation.mask != WIDTH_MASKS[operation.access_width]:
+                    current = device.shadow.get(operation.addr) if device.shadow is not None else None
+                    if current is None:
+                        current = self._read(read, operation.addr, operation.access_width)
+                        report.reads += 1
+                    value |= current & ~operation.mask
+                write(device.write_path, addr, value, operation.access_width)
+                device._shadow_update(operation.addr, value)
+                report.writes += 1
+
+                key = (operation.addr, operation.access_width)
+                if not operation.verify or self.verify == 'none':
+                    expected.pop(key, None)
+                elif self.verify == 'end':
+                    expected[key] = value
+                else:
+                    verifiable += 1
+                    if self.verify == 'each' or (verifiable - 1) % self.sample_interval == 0:
+                        expected[key] = value
+                        self._check(read, expected, report)
+
+            self._check(read, expected, report)
+        report.seconds = time.perf_counter() - start
+        self.operations = []
+        return report
+
+    def _check(self, read, expected: dict, report: BatchReport):
+        for (addr, access_width), value in expected.items():
+            actual = self._read(read, addr, access_width)
+            report.reads += 1
+            report.verified += 1
+            if actual != value:
+                report.mismatches.append(RegisterMismatch(addr, value, actual))
+        expected.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            report = self.apply()
+            assert report.ok, "; ".join(str(mismatch) for mismatch in report.mismatches)
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    from xdma.XdmaDeviceFile import XdmaDeviceFile
+
+    # tmpfs file standing in for the user BAR
+    with tempfile.NamedTemporaryFile(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as stand_in_file:
+        stand_in_file.truncate(0x1000)
+        stand_in_file.flush()
+        user = XdmaDeviceFile(stand_in_file.name, stand_in_file.name, 0, 0x1000)
+        batch = user.batch()
+        batch.write_field(0x20, 0, 1, 1, verify=False)  # reset pulse, set then release
+        batch.write_field(0x20, 0, 1, 0, verify=False)
+        batch.write(0x24, 0x0a)  # strobe, written twice
+        batch.write(0x24, 0x0a)
+        batch.write_field(0x28, 0, 4, 0x5)  # disjoint fields, merged
+        batch.write_field(0x28, 4, 4, 0xa)
+        assert [(operation.addr, operation.value) for operation in batch.operations] == \
+               [(0x20, 1), (0x20, 0), (0x24, 0x0a), (0x24, 0x0a), (0x28, 0xa5)]
+        report = batch.apply()
+        assert report.ok and report.writes == 5 and user._read_register(0x28) == 0xa5
+        print("register batch: passed")
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 11:00
+# @Author  : DAS
+# @Site    :
+# @File    : RegisterBenchmark.py
+# @Software: PyCharm
+# @Comment : latency microbenchmarks of the AXI LITE register and SPI paths
+
+import argparse
+import json
+from dataclasses import dataclass, asdict
+
+from xdma.XdmaSpiController import SpiController
+from xdma.XdmaDeviceFile import *
+
+DEFAULT_OPERATIONS = 20000
+USER_BAR_SIZE = 0x10_0000  # size of the stand-in user BAR
+SCRATCH_ADDRESS = 0x10  # harmless read/write register of the user BAR, as in the XdmaDeviceFile example
+SPI_BASE_ADDRESS = 0x8_0000  # AD9695
+SPI_SCRATCH_ADDRESS = 0x000A  # AD9695 scratch pad
+
+
+@dataclass
+class RegisterBenchmarkResult:
+    case: str
+    operations: int
+    mean: float  # ns per operation
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+    def __str__(self):
+        return (f"{self.case:28s}: mean {self.mean:9.0f} ns, p50/p90/p99/max = {self.p50:.0f}/{self.p90:.0f}/"
+                f"{self.p99:.0f}/{self.max:.0f} ns")
+
+
+class RegisterBenchmark:
+    """
+    Times every single register operation with perf_counter_ns
+
+    user is the device file of the user BAR, address a register that may be freely written, spi an SpiController
+    whose spi_address may be freely written (e.g. the AD9695 scratch pad).
+    """
+
+    def __init__(self, user: XdmaDeviceFile, address: int = SCRATCH_ADDRESS, spi: SpiController = None,
+                 spi_address: int = SPI_SCRATCH_ADDRESS, operations: int = DEFAULT_OPERATIONS):
+        self.user = user
+        self.address = address
+        self.spi = spi
+        self.spi_address = spi_address
+        self.operations = operations
+
+    @staticmethod
+    def stand_in(directory: str = "/dev/shm"):
+        """
+        A tmpfs file mapped like the user BAR, returns (user, spi, path)
+        """
+        path = os.path.join(directory, f"xdma_register_benchmark_{os.getpid()}.bin")
+        with open(path, "wb") as f:
+            f.truncate(USER_BAR_SIZE)
+        return (XdmaDeviceFile(path, path, 0, USER_BAR_SIZE),
+                SpiController(path, path, SPI_BASE_ADDRESS, 0x4_0000), path)
+
+    def _measure(self, case: str, operation) -> RegisterBenchmarkResult:
+        latencies = np.zeros(self.operations, dtype=np.int64)
+        for i in range(min(self.operations, 100)):  # warm up, maps the windows
+            operation(i)
+        for i in range(self.operations):
+            start = time.perf_counter_ns()
+            operation(i)
+            latencies[i] = time.perf_counter_ns() - start
+        p50, p90, p99, maximum = map(float, np.percentile(latencies, [50, 90, 99, 100]))
+        result = RegisterBenchmarkResult(case, self.operations, float(latencies.mean()), p50, p90, p99, maximum)
+        print(result)
+        return result
+
+    def run(self) -> list[RegisterBenchmarkResult]:
+        user, address = self.user, self.address
+        results = [
+            self._measure("read 32-bit", lambda i: user._read_register(address)),
+            self._measure("write 32-bit", lambda i: user._write_register(address, i & 0xFFFF_FFFF)),
+            self._measure("field update", lambda i: user.write_register_field(address, 4, 8, i & 0xFF, strict=False)),
+            self._measure("field update, strict", lambda i: user.write_register_field(address, 4, 8, i & 0xFF, strict=True)),
+        ]
+        if self.spi is not None:
+            spi, spi_address = self.spi, self.spi_address
+            results.append(self._measure("SPI write byte", lambda i: spi.write_byte(spi_address, i & 0x7F)))
+            results.append(self._measure("SPI set byte (readback)", lambda i: spi.set_byte(spi_address, i & 0x7F)))
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="register and SPI path microbenchmarks")
+    parser.add_argument("--device-index", type=int, default=None, help="benchmark the user BAR of this card")
+    parser.add_argument("--stand-in", metavar="DIR", default=None, help="benchmark a file in DIR (e.g. /dev/shm) instead of a card")
+    parser.add_argument("--address", type=lambda text: int(text, 0), default=SCRATCH_ADDRESS)
+    parser.add_argument("--spi-base", type=lambda text: int(text, 0), default=SPI_BASE_ADDRESS)
+    parser.add_argument("--spi-address", type=lambda text: int(text, 0), default=SPI_SCRATCH_ADDRESS)
+    parser.add_argument("--no-spi", action="store_true")
+    parser.add_argument("--operations", type=int, default=DEFAULT_OPERATIONS)
+    parser.add_argument("--json", help="write results as JSON")
+    args = parser.parse_args()
+
+    stand_in_path = None
+    if args.device_index is not None:
+        user_path = f"{get_device_paths()[args.device_index]}{FILE_SEPERATOR}user"
+        user_device = XdmaDeviceFile(user_path, user_path, 0, USER_BAR_SIZE)
+        spi_device = SpiController(user_path, user_path, args.spi_base, 0x4_0000)
+    else:
+        user_device, spi_device, stand_in_path = RegisterBenchmark.stand_in(args.stand_in or "/dev/shm")
+    try:
+        benchmark_results = RegisterBenchmark(user_device, args.address, None if args.no_spi else spi_device,
+                                              args.spi_address, args.operations).run()
+    finally:
+        if stand_in_path is not None:
+            os.remove(stand_in_path)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"device": "stand-in" if stand_in_path else user_path,
+                       "results": [asdict(result) for result in benchmark_results]}, f, indent=2)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 20:30
+# @Author  : DAS
+# @Site    :
+# @File    : RegisterSequence.py
+# @Software: PyCharm
+# @Comment : register programming sequences as data, with a full and an incremental (diff) executor
+
+import json
+import time
+from dataclasses import dataclass, field, asdict
+
+from xdma.RegisterBatch import RegisterBatch, BatchReport, WIDTH_MASKS
+from xdma.RegisterWait import WaitResult
+
+SEQUENCE_FORMAT_VERSION = 3  # 2: RegisterStep.until, 3: RegisterStep.settle
+
+
+@dataclass
+class RegisterStep:
+    addr: int  # relative to the base address of the device
+    value: int
+    access_width: str = 'w'
+    mask: int = None  # bits written and compared, the others are kept by a read-modify-write, None for the whole register
+    delay: float = 0.0  # seconds to wait after the step, the timeout when until is given
+    verify: bool = True
+    always: bool = False  # an action (link restart, strobe) rather than state, see RegisterSequence.run
+    reset: bool = False  # a soft reset wiping the configuration, see RegisterSequence.run
+    until: list = None  # [addr, start, length, expected(, access_width)] conditions ending the delay early
+    settle: float = 0.0  # seconds the until conditions have to hold, so that status bits not yet raised are not taken as done
+
+    def __post_init__(self):
+        full = WIDTH_MASKS[self.access_width]
+        self.mask = full if self.mask is None else self.mask & full
+        self.value &= self.mask
+
+
+@dataclass
+class SequenceReport(BatchReport):
+    skipped: int = 0
+    delay_seconds: float = 0.0  # actually waited, fixed delays and waits for conditions
+    waits: list[WaitResult] = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return super().ok and all(wait.ok for wait in self.waits)
+
+    def errors(self) -> str:
+        return "; ".join([str(mismatch) for mismatch in self.mismatches] + [str(wait) for wait in self.waits if not wait.ok])
+
+    def show_info(self):
+        super().show_info()
+        print(f"\t{self.skipped} steps skipped, {self.delay_seconds:.3f} s of delays")
+        for wait in self.waits:
+            print(f"\t{wait}")
+
+
+class RegisterSequence:
+    """
+    An ordered list of RegisterStep, built with write/write_field/delay, saved as versioned JSON and run on a device
+
+    run(device) replays every step in order, the steps between two delays going out as one RegisterBatch.
+    run(device, diff=True) reads the current state first and only writes what differs:
+        - a plain step runs when the final value the sequence gives its register differs from the device, registers
+          written several times (write sequences) are rewritten as a whole or not at all
+        - always steps run when any plain step runs, nothing does when the device already matches
+        - reset steps never run, their purpose is a known state and the diff establishes it without wiping the rest
+        - a delay is kept only when something was written since the previous delay
+    A reset step that runs is applied right away and invalidates the device's shadow cache, the read-modify-writes and
+    checks after it read the card.
+    """
+
+    def __init__(self, name: str = "", access_width='w', steps: list[RegisterStep] = None):
+        self.name = name
+        self.access_width = access_width  # default of write and write_field
+        self.steps = steps if steps is not None else []
+
+    def write(self, addr: int, value: int, access_width=None, verify: bool = True, delay: float = 0.0,
+              always: bool = False, reset: bool = False, mask: int = None, until: list = None, settle: float = 0.0):
+        self.steps.append(RegisterStep(addr, int(value), access_width or self.access_width, mask, delay, verify, always,
+                                       reset, [list(condition) for condition in until] if until else None, settle))
+        return self
+
+    def write_field(self, addr: int, start: int, length: int, value: int, verify: bool = True, delay: float = 0.0,
+                    always: bool = False, reset: bool = False, access_width=None, until: list = None, settle: float = 0.0):
+        return self.write(addr, int(value) << start, access_width, verify, delay, always, reset,
+                          mask=((1 << length) - 1) << start, until=until, settle=settle)
+
+    def delay(self, seconds: float, until: list = None, settle: float = 0.0):
+        """wait after the last step, at most seconds when until conditions are given"""
+        self.steps[-1].delay += seconds
+        if until:
+            self.steps[-1].until = (self.steps[-1].until or []) + [list(condition) for condition in until]
+            self.steps[-1].settle = max(self.steps[-1].settle, settle)
+        return self
+
+    def __len__(self):
+        return len(self.steps)
+
+    ####################
+    # Execution
+    ####################
+
+    def plan(self, device) -> list[bool]:
+        """which steps a diff run executes, reads every register with plain steps once from the card, refreshing the
+        shadow cache, so that a register changed behind the host (reset, power cycle, another process) is rewritten"""
+        targets = {}  # (addr, access_width) -> (value, mask) after every plain step
+        for step in self.steps:
+            if not step.always and not step.reset:
+                value, mask = targets.get((step.addr, step.access_width), (0, 0))
+                targets[(step.addr, step.access_width)] = ((value & ~step.mask) | step.value, mask | step.mask)
+        changed = {key for key, (value, mask) in targets.items() if device._read_through(*key) & mask != value}
+        return [not step.reset and (bool(changed) if step.always else (step.addr, step.access_width) in changed)
+                for step in self.steps]
+
+    def run(self, device, diff: bool = False, verify: str = 'end') -> SequenceReport:
+        runs = self.plan(device) if diff else [True] * len(self.steps)
+        report = SequenceReport(skipped=runs.count(False))
+        batch = RegisterBatch(device, self.access_width, verify)
+        written = False  # since the last delay
+        for step, run in zip(self.steps, runs):
+            if run:
+                batch.write_masked(step.addr, step.value, step.mask, step.access_width, step.verify)
+                written = True
+                if step.reset:
+                    report.extend(batch.apply())
+                    device.invalidate_shadow()
+            if step.delay > 0 and written:
+                report.extend(batch.apply())
+                if step.until:
+                    wait = device.wait_until(step.until, timeout=step.delay, settle=step.settle,
+                                             label=f"{self.name} step {hex(step.addr)}")
+                    report.waits.append(wait)
+                    report.delay_seconds += wait.seconds
+                else:
+                    time.sleep(step.delay)
+                    report.delay_seconds += step.delay
+                written = False
+        report.extend(batch.apply())
+        return report
+
+    ####################
+    # Serialization
+    ####################
+
+    def to_dict(self) -> dict:
+        return {"version": SEQUENCE_FORMAT_VERSION, "name": self.name, "access_width": self.access_width,
+                "steps": [asdict(step) for step in self.steps]}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        assert data.get("version", 0) <= SEQUENCE_FORMAT_VERSION, f"sequence format {data.get('version')} not supported"
+        return cls(data.get("name", ""), data.get("access_width", 'w'), [RegisterStep(**step) for step in data["steps"]])
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
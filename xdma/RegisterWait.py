@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 9:10
+# @Author  : DAS
+# @Site    :
+# @File    : RegisterWait.py
+# @Software: PyCharm
+# @Comment : polling register fields until they hold, instead of fixed sleeps
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_INTERVAL = 1e-4  # first poll interval, multiplied by backoff after every poll
+DEFAULT_MAX_INTERVAL = 0.02
+DEFAULT_BACKOFF = 2.0
+
+_collectors = threading.local()  # lists of the collect_waits blocks open in the calling thread
+
+
+@dataclass
+class RegisterCondition:
+    addr: int  # relative to the base address of the device
+    start: int
+    length: int
+    expected: int
+    access_width: str = 'w'
+
+    def holds(self, value: int) -> bool:
+        return (value >> self.start) & ((1 << self.length) - 1) == self.expected
+
+
+@dataclass
+class WaitResult:
+    label: str
+    satisfied: bool
+    seconds: float
+    polls: int
+
+    @property
+    def ok(self):
+        return self.satisfied
+
+    def __bool__(self):
+        return self.satisfied
+
+    def __str__(self):
+        return f"{self.label or 'wait'}: {'done' if self.satisfied else 'TIMEOUT'} after {self.seconds * 1000:.1f} ms, {self.polls} polls"
+
+
+@contextmanager
+def collect_waits():
+    """
+    Collect the WaitResult of every wait_until issued by the calling thread inside the block, whatever the device
+
+        with collect_waits() as waits:
+            driver.init_for_das()
+    """
+    waits = []
+    stack = _collectors.__dict__.setdefault('stack', [])
+    stack.append(waits)
+    try:
+        yield waits
+    finally:
+        stack.remove(waits)
+
+
+def _collected(result: WaitResult) -> WaitResult:
+    for waits in getattr(_collectors, 'stack', ()):
+        waits.append(result)
+    return result
+
+
+def wait_until(device, conditions, timeout: float = DEFAULT_TIMEOUT, settle: float = 0.0, interval: float = DEFAULT_INTERVAL,
+               max_interval: float = DEFAULT_MAX_INTERVAL, backoff: float = DEFAULT_BACKOFF, label: str = "") -> WaitResult:
+    """
+    Poll the device until every condition holds, and has held for settle seconds, or timeout seconds have passed
+
+    conditions are RegisterCondition or (addr, start, length, expected[, access_width]) tuples, each register is read
+    once per poll from the card. The interval between polls starts at interval and grows by backoff up to max_interval,
+    short waits are caught early without spinning through long ones.
+    """
+    conditions = [c if isinstance(c, RegisterCondition) else RegisterCondition(*c) for c in conditions]
+    registers = {(c.addr, c.access_width) for c in conditions}
+    start = time.perf_counter()
+    held_since = None
+    polls = 0
+    while True:
+        polls += 1
+        values = {register: device._read_hardware(*register) for register in registers}
+        now = time.perf_counter()
+        if all(c.holds(values[(c.addr, c.access_width)]) for c in conditions):
+            held_since = now if held_since is None else held_since
+            if now - held_since >= settle:
+                return _collected(WaitResult(label, True, now - start, polls))
+        else:
+            held_since = None
+        if now - start >= timeout:
+            return _collected(WaitResult(label, False, now - start, polls))
+        time.sleep(min(interval, max(timeout - (now - start), 0.0)))
+        interval = min(interval * backoff, max_interval)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/21 10:15
+# @Author  : DAS
+# @Site    :
+# @File    : StagingBuffer.py
+# @Software: PyCharm
+# @Comment : per-thread staging of non-contiguous arrays, shared by the platform file operations
+
+import threading
+
+import numpy as np
+
+_staging = threading.local()  # per-thread staging buffer for non-contiguous arrays, grown on demand
+
+
+def contiguous_view(buf: np.ndarray) -> np.ndarray:
+    """buf itself when C-contiguous, otherwise a copy in the reusable staging buffer of the calling thread"""
+    if buf.flags.c_contiguous:
+        return buf
+    staging = getattr(_staging, 'buffer', None)
+    if staging is None or staging.nbytes < buf.nbytes:
+        staging = np.empty(buf.nbytes, dtype=np.uint8)
+        _staging.buffer = staging
+    staged = staging[:buf.nbytes].view(buf.dtype).reshape(buf.shape)
+    np.copyto(staged, buf)
+    return staged
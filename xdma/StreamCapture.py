@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 15:10
+# @Author  : DAS
+# @Site    :
+# @File    : StreamCapture.py
+# @Software: PyCharm
+# @Comment : continuous C2H capture from an AXI ST channel into a ring of preallocated buffers
+
+import queue
+from dataclasses import dataclass
+
+from xdma.XdmaDeviceFile import *
+
+MAX_EMPTY_READS = 3  # consecutive zero-byte reads that end the capture, e.g. end of a stand-in file
+
+
+@dataclass
+class CaptureStats:
+    blocks: int = 0
+    bytes: int = 0
+    short_blocks: int = 0  # reads that ended before the slot was full, e.g. at the end of an AXI ST packet
+    stalls: int = 0  # reads delayed because every slot was still held by consumers
+    stall_seconds: float = 0.0
+    dropped_blocks: int = 0  # blocks read into the scratch buffer and discarded, overrun = 'drop' only
+    dropped_bytes: int = 0
+    max_occupancy: int = 0  # slots filled or held by consumers
+    occupancy_sum: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mean_occupancy(self):
+        return self.occupancy_sum / self.blocks if self.blocks else 0.0
+
+    @property
+    def throughput(self):
+        """MB/s"""
+        return self.bytes / (1 << 20) / self.seconds if self.seconds > 0 else 0.0
+
+    def show_info(self):
+        print(f"\tcaptured: {self.blocks} blocks, {self.bytes} bytes, {self.throughput:.1f} MB/s")
+        print(f"\tshort blocks: {self.short_blocks}")
+        print(f"\tstalls: {self.stalls}, {self.stall_seconds:.3f} s")
+        print(f"\tdropped: {self.dropped_blocks} blocks, {self.dropped_bytes} bytes")
+        print(f"\tring occupancy: mean {self.mean_occupancy:.2f}, max {self.max_occupancy}")
+
+
+class CaptureSlot:
+    """A filled slot of the ring, data is a view into the slot and stays valid until release()"""
+
+    def __init__(self, capture, index: int, sequence: int, nbytes: int, data: np.ndarray, timestamp_ns: int):
+        self.capture = capture
+        self.index = index
+        self.sequence = sequence  # block number in capture order, gaps mark dropped blocks
+        self.nbytes = nbytes
+        self.data = data
+        self.timestamp_ns = timestamp_ns  # time.monotonic_ns() when the read of the block completed
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release(self.index)
+            self.capture = None
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class StreamCapture:
+    """
+    A reader thread fills a ring of slot_count preallocated arrays from an AXI ST c2h channel
+
+    Consumers iterate over the capture to get filled slots in order, and hand every slot back by release().
+    When no slot is free the reader waits (overrun = 'block') or reads into a scratch buffer and discards the
+    block (overrun = 'drop'), the card FIFO keeps draining either way while consumers compute.
+    """
+
+    def __init__(self, device: XdmaDeviceFile, block_shape, dtype=np.uint8, slot_count: int = 8,
+                 overrun: str = 'block', max_empty_reads: int = MAX_EMPTY_READS, slots: np.ndarray = None):
+        """
+        slots: optional preallocated ring of shape (slot_count,) + block_shape, e.g. page-aligned memory for O_DIRECT
+        """
+        assert device.read_exists(), "capture needs a c2h device file"
+        assert slot_count > 0 and overrun in ('block', 'drop')
+        self.device = device
+        shape = (slot_count,) + tuple(np.atleast_1d(block_shape))
+        if slots is None:
+            slots = np.empty(shape, dtype=dtype)
+        assert slots.shape == shape and slots.dtype == dtype and slots.flags.c_contiguous, "bad ring buffer"
+        self.slots = slots
+        self.slots.reshape(-1).view(np.uint8)[::4096] = 0  # touch every page before the capture starts
+        self.overrun = overrun
+        self.max_empty_reads = max_empty_reads
+        self.stats = CaptureStats()
+        self.free_slots = queue.Queue()
+        self.filled_slots = queue.Queue()
+        for index in range(slot_count):
+            self.free_slots.put(index)
+        self.scratch = np.empty_like(self.slots[0]) if overrun == 'drop' else None
+        self.stop_event = threading.Event()
+        self.reader_thread = None
+        self.error = None
+
+    @property
+    def slot_count(self):
+        return len(self.slots)
+
+    def occupancy(self):
+        return self.slot_count - self.free_slots.qsize()
+
+    ####################
+    # Reader side
+    ####################
+
+    def start(self):
+        assert self.reader_thread is None, "capture already started"
+        self.reader_thread = threading.Thread(target=self._reader, name=f"capture {self.device.read_path}", daemon=True)
+        self.reader_thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.reader_thread is not None:
+            self.reader_thread.join()
+
+    def _next_free_slot(self):
+        try:
+            return self.free_slots.get_nowait()
+        except queue.Empty:
+            if self.overrun == 'drop':
+                return None
+        self.stats.stalls += 1
+        stall_start = time.perf_counter()
+        while not self.stop_event.is_set():
+            try:
+                index = self.free_slots.get(timeout=0.1)
+                self.stats.stall_seconds += time.perf_counter() - stall_start
+                return index
+            except queue.Empty:
+                pass
+        return None
+
+    def _reader(self):
+        empty_reads = 0
+        sequence = 0
+        start = time.perf_counter()
+        try:
+            with self.device:
+                while not self.stop_event.is_set() and empty_reads < self.max_empty_reads:
+                    index = self._next_free_slot()
+                    target = self.scratch if index is None else self.slots[index]
+                    if target is None:  # stopped while stalled
+                        break
+                    nread = read_from_handle(self.device.read_handle, target, target.nbytes, verbose=False)
+                    timestamp_ns = time.monotonic_ns()
+                    if nread == 0:
+                        empty_reads += 1
+                        if index is not None:
+                            self.free_slots.put(index)
+                        continue
+                    empty_reads = 0
+                    if index is None:
+                        self.stats.dropped_blocks += 1
+                        self.stats.dropped_bytes += nread
+                    else:
+                        self.stats.blocks += 1
+                        self.stats.bytes += nread
+                        self.stats.short_blocks += nread != target.nbytes
+                        occupancy = self.occupancy()
+                        self.stats.occupancy_sum += occupancy
+                        self.stats.max_occupancy = max(self.stats.max_occupancy, occupancy)
+                        self.filled_slots.put((index, sequence, nread, timestamp_ns))
+                    sequence += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self.stats.seconds = time.perf_counter() - start
+            self.filled_slots.put(None)  # end of capture
+
+    ####################
+    # Consumer side
+    ####################
+
+    def release(self, index: int):
+        self.free_slots.put(index)
+
+    def __iter__(self):
+        while True:
+            item = self.filled_slots.get()
+            if item is None:
+                self.filled_slots.put(None)  # keep later iterations terminating as well
+                if self.error is not None:
+                    raise self.error
+                return
+            index, sequence, nbytes, timestamp_ns = item
+            slot = self.slots[index]
+            if nbytes != slot.nbytes:
+                # short block, a flat view of the complete items only
+                slot = slot.reshape(-1)[:nbytes // slot.itemsize]
+            yield CaptureSlot(self, index, sequence, nbytes, slot, timestamp_ns)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # regular file standing in for the c2h stream, the capture ends at the end of the file
+    with tempfile.NamedTemporaryFile() as stand_in_file:
+        stand_in_file.write(np.random.randint(0, 256, size=64 << 20, dtype=np.uint8).tobytes())
+        stand_in_file.flush()
+        c2h = XdmaDeviceFile(read_device_file_path=stand_in_file.name)
+        checksum = 0
+        with StreamCapture(c2h, 1 << 20, np.uint8, slot_count=8) as capture:
+            for block in capture:
+                with block:
+                    checksum += int(block.data.sum(dtype=np.uint64))
+        print(f"checksum = {checksum}")
+        capture.stats.show_info()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 16:20
+# @Author  : DAS
+# @Site    :
+# @File    : StreamRecorder.py
+# @Software: PyCharm
+# @Comment : record a C2H stream to files striped over several disks
+
+import os
+import queue
+from dataclasses import dataclass, field
+
+from xdma.BufferPool import dma_buffer_pool
+from xdma.StreamCapture import *
+
+DIRECT_ALIGNMENT = 4096  # O_DIRECT needs buffers, lengths and file offsets aligned to the logical block size
+# one row per recorded block in <prefix>_<stripe>.index next to the data files of the stripe, see read_index
+INDEX_DTYPE = np.dtype([('sequence', np.int64), ('stripe', np.int32), ('file', np.int32), ('offset', np.int64),
+                        ('nbytes', np.int64), ('timestamp_ns', np.int64)])
+
+
+@dataclass
+class RecorderStats:
+    bytes_written: int = 0
+    blocks_written: int = 0
+    dropped_bytes: int = 0  # from the capture, blocks discarded because every slot was waiting for a disk
+    dropped_blocks: int = 0
+    seconds: float = 0.0
+    files: list[str] = field(default_factory=list)
+    index_files: list[str] = field(default_factory=list)
+
+    @property
+    def throughput(self):
+        """sustained MB/s written to disk"""
+        return self.bytes_written / (1 << 20) / self.seconds if self.seconds > 0 else 0.0
+
+    def show_info(self):
+        print(f"\trecorded: {self.bytes_written} bytes in {self.blocks_written} blocks, {self.throughput:.1f} MB/s")
+        print(f"\tdropped: {self.dropped_blocks} blocks, {self.dropped_bytes} bytes")
+        print(f"\tfiles: {len(self.files)}")
+
+
+class StripeWriter:
+    """
+    Writes the blocks of one stripe into a sequence of files in one directory, rotating by size or duration, and an
+    INDEX_DTYPE row per block into the index file of the stripe
+    """
+
+    def __init__(self, recorder, directory: str, stripe: int):
+        self.recorder = recorder
+        self.directory = directory
+        self.stripe = stripe
+        self.blocks = queue.Queue()
+        self.fd = -1
+        self.buffered_fd = -1  # O_DIRECT only, for the tail of blocks whose length is not aligned
+        self.unaligned = False  # O_DIRECT only, the file ends with such a tail, the next block starts a new file
+        self.file_index = 0
+        self.file_bytes = 0
+        self.file_start = 0.0
+        self.index_file = None
+        self.index_row = np.zeros(1, dtype=INDEX_DTYPE)
+        self.thread = threading.Thread(target=self._run, name=f"recorder stripe {stripe}", daemon=True)
+
+    def _open_next(self):
+        self._close()
+        path = os.path.join(self.directory, f"{self.recorder.prefix}_{self.stripe:02d}_{self.file_index:05d}.bin")
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        if self.recorder.direct:
+            self.fd = os.open(path, flags | os.O_DIRECT)
+            self.buffered_fd = os.open(path, os.O_WRONLY)
+        else:
+            self.fd = os.open(path, flags)
+        self.file_index += 1
+        self.file_bytes = 0
+        self.unaligned = False
+        self.file_start = time.monotonic()
+        with self.recorder.lock:
+            self.recorder.stats.files.append(path)
+
+    def _open_index(self):
+        path = os.path.join(self.directory, f"{self.recorder.prefix}_{self.stripe:02d}.index")
+        self.index_file = open(path, "wb")
+        with self.recorder.lock:
+            self.recorder.stats.index_files.append(path)
+
+    def _close(self):
+        if self.buffered_fd != -1:
+            os.close(self.buffered_fd)
+            self.buffered_fd = -1
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
+
+    def _rotation_due(self):
+        if self.unaligned:
+            return True
+        recorder = self.recorder
+        if recorder.max_file_bytes and self.file_bytes >= recorder.max_file_bytes:
+            return True
+        return recorder.max_file_seconds and time.monotonic() - self.file_start >= recorder.max_file_seconds
+
+    def _write(self, data: memoryview):
+        # O_DIRECT file offsets stay aligned as only the last block of a file may have an unaligned length
+        aligned = len(data) - len(data) % DIRECT_ALIGNMENT if self.recorder.direct else len(data)
+        written = 0
+        while written < aligned:
+            written += os.pwrite(self.fd, data[written:aligned], self.file_bytes + written)
+        if written < len(data):
+            self.unaligned = True  # a short block (stream tail, timeout), rotate before the next one
+        while written < len(data):
+            written += os.pwrite(self.buffered_fd, data[written:], self.file_bytes + written)
+        self.file_bytes += written
+
+    def write_block(self, data: memoryview, sequence: int, timestamp_ns: int = 0):
+        if self.fd == -1 or self._rotation_due():
+            self._open_next()
+        if self.index_file is None:
+            self._open_index()
+        row = self.index_row[0]
+        row['sequence'], row['stripe'], row['file'] = sequence, self.stripe, self.file_index - 1
+        row['offset'], row['nbytes'], row['timestamp_ns'] = self.file_bytes, len(data), timestamp_ns
+        self._write(data)
+        self.index_file.write(self.index_row.tobytes())  # after the data, a row always points at complete bytes
+
+    def close(self):
+        self._close()
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+
+    def _run(self):
+        try:
+            while True:
+                block = self.blocks.get()
+                if block is None:
+                    break
+                with block:
+                    self.write_block(memoryview(block.data.reshape(-1).view(np.uint8)), block.sequence,
+                                     block.timestamp_ns)
+                with self.recorder.lock:
+                    self.recorder.stats.bytes_written += block.nbytes
+                    self.recorder.stats.blocks_written += 1
+        except Exception as e:
+            self.recorder.error = e
+            self.recorder.capture.stop_event.set()
+            while self.blocks.get() is not None:  # keep the dispatcher from blocking
+                pass
+        finally:
+            self.close()
+
+
+class StreamRecorder:
+    """
+    Record an AXI ST c2h channel to disk
+
+    A StreamCapture reader thread keeps draining the card into a ring of page-aligned pool slots while one writer thread per
+    directory writes filled slots, block k going to directory k % len(directories), so reads and disk writes overlap and
+    several disks are written in parallel. Files rotate after max_file_bytes or max_file_seconds. With overrun = 'drop'
+    (default) the card is never stalled by slow disks, discarded bytes are counted instead.
+
+    Drops, short blocks and the independent rotation of the stripes mean the data files cannot simply be concatenated,
+    every stripe keeps an index of its blocks (INDEX_DTYPE) and read_recording puts the stream back in order:
+
+        for row, data in read_recording(directories, prefix):
+            ...  # gaps in row['sequence'] are dropped blocks
+
+    direct = True opens the files with O_DIRECT, the page cache is bypassed and no extra copy is made by the kernel.
+    splice is not used: the xdma character device does not implement splice_read, and the ring is needed for drop
+    accounting anyway.
+    """
+
+    def __init__(self, device: XdmaDeviceFile, directories: list[str], block_size: int = 4 << 20, slot_count: int = 16,
+                 prefix: str = "capture", max_file_bytes: int = 1 << 30, max_file_seconds: float = 0,
+                 direct: bool = False, overrun: str = 'drop'):
+        assert len(directories) > 0
+        assert not direct or block_size % DIRECT_ALIGNMENT == 0, "O_DIRECT needs an aligned block size"
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.max_file_seconds = max_file_seconds
+        self.direct = direct
+        self.device = device
+        self.directories = directories
+        self.block_size = block_size
+        self.slot_count = slot_count
+        self.overrun = overrun
+        self.capture = None  # ring, capture and writers only live for one record() call
+        self.writers = []
+        self.stats = RecorderStats()
+        self.lock = threading.Lock()
+        self.error = None
+
+    def record(self, duration: float = None, max_bytes: int = None) -> RecorderStats:
+        """
+        Record until the stream ends, duration seconds have passed or max_bytes were captured, the recorder can record
+        again afterwards, into new files when the prefix is changed in between
+        """
+        self.stats = RecorderStats()
+        self.error = None
+        # pool buffers are page aligned, as O_DIRECT requires
+        ring = dma_buffer_pool.acquire((self.slot_count, self.block_size))
+        self.capture = StreamCapture(self.device, self.block_size, np.uint8, self.slot_count, overrun=self.overrun,
+                                     slots=ring)
+        self.writers = [StripeWriter(self, directory, stripe) for stripe, directory in enumerate(self.directories)]
+        for writer in self.writers:
+            writer.thread.start()
+        start = time.monotonic()
+        try:
+            with self.capture:
+                for block in self.capture:
+                    self.writers[block.sequence % len(self.writers)].blocks.put(block)
+                    if duration is not None and time.monotonic() - start >= duration:
+                        break
+                    if max_bytes is not None and self.capture.stats.bytes >= max_bytes:
+                        break
+        finally:
+            for writer in self.writers:
+                writer.blocks.put(None)
+            for writer in self.writers:
+                writer.thread.join()
+            self.stats.seconds = time.monotonic() - start
+            self.stats.dropped_bytes = self.capture.stats.dropped_bytes
+            self.stats.dropped_blocks = self.capture.stats.dropped_blocks
+            dma_buffer_pool.release(ring)
+        if self.error is not None:
+            raise self.error
+        return self.stats
+
+
+def read_index(directories: list[str], prefix: str = "capture") -> np.ndarray:
+    """the index rows of every stripe of a recording, in capture order"""
+    rows = [np.fromfile(os.path.join(directory, f"{prefix}_{stripe:02d}.index"), dtype=INDEX_DTYPE)
+            for stripe, directory in enumerate(directories)
+            if os.path.exists(os.path.join(directory, f"{prefix}_{stripe:02d}.index"))]
+    index = np.concatenate(rows) if rows else np.zeros(0, dtype=INDEX_DTYPE)
+    return index[np.argsort(index['sequence'], kind='stable')]
+
+
+def read_recording(directories: list[str], prefix: str = "capture"):
+    """yields (index row, bytes) for every recorded block in capture order"""
+    files = {}
+    try:
+        for row in read_index(directories, prefix):
+            key = (int(row['stripe']), int(row['file']))
+            if key not in files:
+                files[key] = open(os.path.join(directories[key[0]], f"{prefix}_{key[0]:02d}_{key[1]:05d}.bin"), "rb")
+            files[key].seek(int(row['offset']))
+            yield row, files[key].read(int(row['nbytes']))
+    finally:
+        for f in files.values():
+            f.close()
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # regular file standing in for the c2h stream, striped over two directories
+    with tempfile.NamedTemporaryFile() as stand_in_file, tempfile.TemporaryDirectory() as disk_0, \
+            tempfile.TemporaryDirectory() as disk_1:
+        stand_in_file.write(np.random.randint(0, 256, size=256 << 20, dtype=np.uint8).tobytes())
+        stand_in_file.flush()
+        c2h = XdmaDeviceFile(read_device_file_path=stand_in_file.name)
+        recorder = StreamRecorder(c2h, [disk_0, disk_1], block_size=4 << 20, max_file_bytes=64 << 20, overrun='block')
+        recorder.record().show_info()
+
+    # three stripes rotating at different points and a short last block, the index puts the stream back in order
+    with tempfile.NamedTemporaryFile() as stand_in_file, tempfile.TemporaryDirectory() as disk_0, \
+            tempfile.TemporaryDirectory() as disk_1, tempfile.TemporaryDirectory() as disk_2:
+        source = np.random.randint(0, 256, size=(5 << 20) + 1000, dtype=np.uint8).tobytes()
+        stand_in_file.write(source)
+        stand_in_file.flush()
+        c2h = XdmaDeviceFile(read_device_file_path=stand_in_file.name)
+        directories = [disk_0, disk_1, disk_2]
+        StreamRecorder(c2h, directories, block_size=256 << 10, max_file_bytes=(1 << 20) + 1, overrun='block').record()
+        index = read_index(directories)
+        assert (index['sequence'] == np.arange(len(index))).all()
+        assert b"".join(data for row, data in read_recording(directories)) == source
+        print("reassembly from the index: passed")
+
+    # O_DIRECT: a short block followed by a full one, the short block ends its file and the offsets stay aligned
+    with tempfile.NamedTemporaryFile() as stand_in_file, tempfile.TemporaryDirectory(dir=".") as disk:  # tmpfs may refuse O_DIRECT
+        c2h = XdmaDeviceFile(read_device_file_path=stand_in_file.name)
+        recorder = StreamRecorder(c2h, [disk], block_size=1 << 20, slot_count=2, direct=True)
+        writer = StripeWriter(recorder, disk, 0)
+        with dma_buffer_pool.borrow((2, 1 << 20)) as blocks:
+            blocks[:] = np.random.randint(0, 256, size=blocks.shape, dtype=np.uint8)
+            writer.write_block(memoryview(blocks[0, :1000]), 0)
+            writer.write_block(memoryview(blocks[1]), 1)
+            writer.close()
+            recorded = b"".join(open(path, "rb").read() for path in recorder.stats.files)
+            assert len(recorder.stats.files) == 2 and recorded == blocks[0, :1000].tobytes() + blocks[1].tobytes()
+        print("O_DIRECT short block: passed")
+
+    # recording twice with one recorder, each record() has its own ring
+    with tempfile.NamedTemporaryFile() as stand_in_file, tempfile.TemporaryDirectory() as disk:
+        stand_in_file.write(bytes(4 << 20))
+        stand_in_file.flush()
+        c2h = XdmaDeviceFile(read_device_file_path=stand_in_file.name)
+        recorder = StreamRecorder(c2h, [disk], block_size=1 << 20, slot_count=4, overrun='block')
+        used_bytes = dma_buffer_pool.stats()["used_bytes"]
+        for take in ("first", "second"):
+            recorder.prefix = take
+            assert recorder.record().bytes_written == 4 << 20
+            assert dma_buffer_pool.stats()["used_bytes"] == used_bytes
+        print("repeated record: passed")
@@ -12,6 +12,8 @@ import platform
 
 import numpy as np
 
+from xdma.StagingBuffer import contiguous_view
+
 ####################
 # C function parameters
 ####################
@@ -26,6 +28,15 @@ INVALID_HANDLE_VALUE = 0xffffffffffffffff
 FILE_BEGIN = 0
 FILE_CURRENT = 1
 
+
+
+class OVERLAPPED(ctypes.Structure):
+    # only Offset/OffsetHigh are used, on a synchronous handle (no FILE_FLAG_OVERLAPPED) they set where ReadFile/WriteFile
+    # transfer, the file pointer is still updated and the calls on one handle are serialized, there is no concurrency
+    _fields_ = [("Internal", ctypes.c_void_p), ("InternalHigh", ctypes.c_void_p),
+                ("Offset", ctypes.c_uint32), ("OffsetHigh", ctypes.c_uint32), ("hEvent", ctypes.c_void_p)]
+
+
 ####################
 # C functions and its python interface
 ####################
@@ -91,22 +102,64 @@ def call_with_func(winfunc, *args):
         raise ctypes.WinError()
     return result
 
-def read_from_handle(handle, buf: np.ndarray, nbytes):
+def read_from_handle(handle, buf: np.ndarray, nbytes, verbose: bool = True):
     nread = ctypes.c_uint32()
     call_with_func(ReadFile, handle, buf.ctypes.data_as(ctypes.c_char_p), nbytes, ctypes.byref(nread), None)
-    if int(nread.value) != int(nbytes):
+    if verbose and int(nread.value) != int(nbytes):
         print(f"bad read {nread.value} / {nbytes}")
     return nread.value
 
 
-def write_to_handle(handle, buf: np.ndarray, nbytes):
+def write_to_handle(handle, buf: np.ndarray, nbytes, verbose: bool = True):
+    buf = contiguous_view(buf)  # WriteFile takes a raw pointer, strided arrays must be packed first
     nwritten = ctypes.c_uint32()
     call_with_func(WriteFile, handle, buf.ctypes.data_as(ctypes.c_char_p), nbytes, ctypes.byref(nwritten), None)
-    if int(nwritten.value) != int(nbytes):
+    if verbose and int(nwritten.value) != int(nbytes):
         print(f"bad write {nwritten.value} / {nbytes}")
     return nwritten.value
 
 
+def pread_from_handle(handle, buf: np.ndarray, nbytes, offset, verbose: bool = True):
+    overlapped = OVERLAPPED(None, None, offset & 0xFFFFFFFF, offset >> 32, None)
+    nread = ctypes.c_uint32()
+    call_with_func(ReadFile, handle, buf.ctypes.data_as(ctypes.c_char_p), nbytes, ctypes.byref(nread), ctypes.byref(overlapped))
+    if verbose and int(nread.value) != int(nbytes):
+        print(f"bad read {nread.value} / {nbytes} @ {hex(offset)}")
+    return nread.value
+
 
+def pwrite_to_handle(handle, buf: np.ndarray, nbytes, offset, verbose: bool = True):
+    buf = contiguous_view(buf)
+    overlapped = OVERLAPPED(None, None, offset & 0xFFFFFFFF, offset >> 32, None)
+    nwritten = ctypes.c_uint32()
+    call_with_func(WriteFile, handle, buf.ctypes.data_as(ctypes.c_char_p), nbytes, ctypes.byref(nwritten), ctypes.byref(overlapped))
+    if verbose and int(nwritten.value) != int(nbytes):
+        print(f"bad write {nwritten.value} / {nbytes} @ {hex(offset)}")
+    return nwritten.value
 
 
+# there is no scatter/gather for synchronous handles on Windows, buffers are transferred one by one on the same handle
+def readv_from_handle(handle, bufs: list[np.ndarray], offset: int = -1):
+    total = 0
+    for buf in bufs:
+        if offset >= 0:
+            nread = pread_from_handle(handle, buf, buf.nbytes, offset + total)
+        else:
+            nread = read_from_handle(handle, buf, buf.nbytes)
+        total += nread
+        if nread != buf.nbytes:
+            break
+    return total
+
+
+def writev_to_handle(handle, bufs: list[np.ndarray], offset: int = -1):
+    total = 0
+    for buf in bufs:
+        if offset >= 0:
+            nwritten = pwrite_to_handle(handle, buf, buf.nbytes, offset + total)
+        else:
+            nwritten = write_to_handle(handle, buf, buf.nbytes)
+        total += nwritten
+        if nwritten != buf.nbytes:
+            break
+    return total
@@ -6,8 +6,14 @@
 # @Software: PyCharm 
 # @Comment :
 
+from concurrent.futures import ThreadPoolExecutor
+
 from xdma.XdmaDeviceFile import *
 
+MAX_CHANNELS = 4  # the IP has up to 4 H2C and 4 C2H engines
+XDMA_SUBSYSTEM_IDENTIFIER = 0x1fc  # bits [31:20] of every channel identifier register
+STRIPE_ALIGNMENT = 4096
+
 
 class XdmaDriver:
     """XDMA设备驱动,包含几个可能存在的Device File的相关方法"""
@@ -25,20 +31,25 @@ class XdmaDriver:
 
     def __init__(self, device_index: int):
         self.device_path = get_device_paths()[device_index]
-        self.channel_count = 1 if platform.system() == "Linux" else 4  # for windows, traversing up to 4 DMA channels
         print(f"device path={self.device_path}")
+        self.control_path = f"{self.device_path}{FILE_SEPERATOR}control"
+        self.control_device = XdmaDeviceFile(self.control_path, self.control_path)
+        if platform.system() == "Linux":
+            self.h2c_count = self.count_channels("h2c")
+            self.c2h_count = self.count_channels("c2h")
+        else:
+            self.h2c_count = self.c2h_count = MAX_CHANNELS  # for windows, traversing up to 4 DMA channels
+        self.channel_count = max(self.h2c_count, self.c2h_count)
         self.h2c_devices, self.c2h_devices, self.dma_devices = [], [], []
-        for i in range(self.channel_count):
-            c2h_path = f"{self.device_path}{FILE_SEPERATOR}c2h_{i}"
-            h2c_path = f"{self.device_path}{FILE_SEPERATOR}h2c_{i}"
-            self.c2h_devices.append(XdmaDeviceFile(read_device_file_path=c2h_path))
-            self.h2c_devices.append(XdmaDeviceFile(write_device_file_path=h2c_path))
+        for i in range(self.c2h_count):
+            self.c2h_devices.append(XdmaDeviceFile(read_device_file_path=self.channel_path("c2h", i)))
+        for i in range(self.h2c_count):
+            self.h2c_devices.append(XdmaDeviceFile(write_device_file_path=self.channel_path("h2c", i)))
+        for i in range(min(self.h2c_count, self.c2h_count)):
             self.dma_devices.append(
-                XdmaDeviceFile(read_device_file_path=c2h_path, write_device_file_path=h2c_path))
+                XdmaDeviceFile(read_device_file_path=self.channel_path("c2h", i), write_device_file_path=self.channel_path("h2c", i)))
         self.bypass_path = f"{self.device_path}{FILE_SEPERATOR}bypass"
         self.bypass_device = XdmaDeviceFile(self.bypass_path, self.bypass_path)
-        self.control_path = f"{self.device_path}{FILE_SEPERATOR}control"
-        self.control_device = XdmaDeviceFile(self.control_path, self.control_path)
         self.user_path = f"{self.device_path}{FILE_SEPERATOR}user"
         self.user_device = XdmaDeviceFile(self.user_path, self.user_path)
 
@@ -53,6 +64,67 @@ class XdmaDriver:
                 print(f"\t{device_file}")
                 device_file.close()
 
+    def channel_path(self, direction: str, index: int):
+        return f"{self.device_path}{FILE_SEPERATOR}{direction}_{index}"
+
+    def channel_exists(self, direction: str, index: int) -> bool:
+        """
+        A channel is usable when its device node exists and its engine answers with the subsystem identifier
+        """
+        if not os.path.exists(self.channel_path(direction, index)):
+            return False
+        base = (0x0000 if direction == "h2c" else 0x1000) + index * 0x100
+        return self.control_device.read_register_field(base, 20, 12) == XDMA_SUBSYSTEM_IDENTIFIER
+
+    def count_channels(self, direction: str) -> int:
+        count = 0
+        while count < MAX_CHANNELS and self.channel_exists(direction, count):
+            count += 1
+        return count
+
+    def _striped(self, devices: list[XdmaDeviceFile], addr: int, buffer: np.ndarray, write: bool) -> int:
+        assert len(devices) > 0, "no DMA channel available"
+        assert buffer.flags.c_contiguous, "striped transfer needs a C-contiguous buffer"
+        flat = buffer.reshape(-1).view(np.uint8)
+        if flat.nbytes == 0:
+            return 0
+        # one contiguous, page-aligned part per engine, each engine moves its part in place, a buffer smaller than
+        # len(devices) parts leaves the last engines without a part
+        part_size = max(-(-flat.nbytes // len(devices) // STRIPE_ALIGNMENT) * STRIPE_ALIGNMENT, STRIPE_ALIGNMENT)
+        parts = [(device, start) for device, start in zip(devices, range(0, flat.nbytes, part_size))]
+
+        def transfer(device: XdmaDeviceFile, start: int):
+            part = flat[start:start + part_size]
+            if write:
+                return device.write_chunked(addr + start, part).transferred
+            return device.read_chunked(addr + start, part).transferred
+
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            return sum(executor.map(lambda part: transfer(*part), parts))
+
+    def read_striped(self, addr: int, buffer: np.ndarray) -> int:
+        """
+        AXI MM read split across all C2H engines in parallel, the parts land in buffer directly
+        """
+        return self._striped(self.c2h_devices, addr, buffer, write=False)
+
+    def write_striped(self, addr: int, data: np.ndarray) -> int:
+        """
+        AXI MM write split across all H2C engines in parallel
+        """
+        return self._striped(self.h2c_devices, addr, data, write=True)
+
+    def test_striped_bandwidth(self, size: int = 256 << 20):
+        source = np.random.randint(0, 256, size=size, dtype=np.uint8)
+        target = np.empty_like(source)
+        start = time.time()
+        self.write_striped(0, source)
+        print(f"host to carrier bandwidth over {self.h2c_count} engines: {size / (1 << 20) / (time.time() - start)} MB/s")
+        start = time.time()
+        self.read_striped(0, target)
+        print(f"carrier to host bandwidth over {self.c2h_count} engines: {size / (1 << 20) / (time.time() - start)} MB/s")
+        print(f"striped integrity: {'passed' if (source == target).all() else 'failed'}")
+
     def show_info(self):
         # TODO: more status information
         print("\nInformation in register space will be listed below:")
@@ -83,3 +155,4 @@ if __name__ == '__main__':
     xdma_device.show_info()
     xdma_device.dma_devices[0].test_integrity()
     xdma_device.dma_devices[0].test_bandwidth(8 << 20)
+    xdma_device.test_striped_bandwidth()
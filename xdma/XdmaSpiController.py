@@ -7,6 +7,7 @@
 # @Comment :
 
 from abc import abstractmethod
+from xdma.RegisterBatch import BatchReport
 from xdma.XdmaDeviceFile import *
 
 
@@ -21,10 +22,25 @@ class SpiController(XdmaDeviceFile):
 
     def set_byte(self, addr: int, value: int):
         self.write_byte(addr, value)
-        value_after_write = self.read_byte(addr)
+        value_after_write = self._read_through(addr, 'b')
         if value_after_write != value:
             print(f"expected = {hex(value)}, actual = {hex(value_after_write)} @ {hex(addr)}")
 
+    def batch(self, verify: str = 'end', sample_interval: int = DEFAULT_SAMPLE_INTERVAL) -> RegisterBatch:
+        """
+        collect byte writes of a configuration sequence, sent through one mapping by apply(), see RegisterBatch for
+        the verify policies
+        """
+        return RegisterBatch(self, 'b', verify, sample_interval)
+
+    def set_bytes(self, writes: list[tuple[int, int]], verify: str = 'end') -> BatchReport:
+        """write (addr, value) pairs in order, returns the report instead of printing mismatches"""
+        batch = self.batch(verify)
+        for addr, value in writes:
+            assert 0 <= value <= 0xFF, "bad register value"
+            batch.write(addr, value)
+        return batch.apply()
+
     def show_default(self):
         self.write_byte(0x0000, 0x01)
         self.write_byte(0x0000, 0x00)